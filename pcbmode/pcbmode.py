@@ -1,7 +1,6 @@
 #!/usr/bin/python
 
 import os
-import json
 import argparse
 
 try:
@@ -20,6 +19,12 @@ from .utils import excellon
 from .utils import messages as msg
 from .utils import bom
 from .utils import coord_file
+from .utils import route_lengths
+from .utils import point
+from .utils import path_store
+from .utils import svgpath
+from .utils import geometry
+from .utils import font
 from .utils.board import Board
 
 
@@ -101,6 +106,22 @@ def cmdArgSetup(pcbmode_version):
                       dest='make_bom', default=False, 
                       help='Create a bill of materials')
 
+    argp.add_argument('--route-lengths',
+                      action='store_true', dest='route_lengths', default=False,
+                      help="Report the length of each route, by layer and route id")
+
+    argp.add_argument('--gc-path-db',
+                      action='store_true', dest='gc_path_db', default=False,
+                      help="Remove the paths that weren't used in this run from the path database. Use with a complete run, e.g., '-m --fab'")
+
+    argp.add_argument('--cache-stats',
+                      action='store_true', dest='cache_stats', default=False,
+                      help="Report how well the path database did: hits, misses, bytes loaded and written, and time spent on misses")
+
+    argp.add_argument('--path-cache', nargs='?',
+                      dest='path_cache', default=False,
+                      help="Use a path cache shared by all boards, in this directory or by default the user's cache directory, instead of the board's own path database")
+
     argp.add_argument('--sig-dig', nargs=1,
                       dest='sig_dig', default=False,
                       help="Number of significant digits to use when generating the board's SVG. Valid values are between 2 and 8.")
@@ -220,20 +241,6 @@ def makeConfig(name, version, cmdline_args):
     config.stk['surface-layer-names'] = [config.stk['layer-names'][0], config.stk['layer-names'][-1]]
     config.stk['internal-layer-names'] = config.stk['layer-names'][1:-1]
 
-    #---------------------------------------------------------------
-    # Path database
-    #---------------------------------------------------------------
-    filename = os.path.join(config.cfg['locations']['boards'], 
-                            config.cfg['name'],
-                            config.cfg['locations']['build'],
-                            'paths_db.json')
-
-    # Open database file. If it doesn't exist, leave the database in
-    # ots initial state of {}
-    if os.path.isfile(filename):
-        config.pth = utils.dictFromJsonFile(filename)
-
-
     #----------------------------------------------------------------
     # Routing
     #----------------------------------------------------------------
@@ -274,6 +281,71 @@ def makeConfig(name, version, cmdline_args):
         else:
             msg.info("Commandline significant digit specification not in range, setting to %d" % config.cfg['significant-digits'])
 
+    # Points read the precision once, here, rather than when each is made
+    point.setSignificantDigits(config.cfg['significant-digits'])
+
+    # Coordinates can be kept as integers on a grid, in nanometres,
+    # instead of as floats. The grid must be a power of ten (1, 10,
+    # 100...) and is stored as the amount of decimal digits of a mm
+    grid = config.brd['config'].get('fixed-point-grid')
+    if grid:
+        digits = 6 - len(str(grid)) + 1
+        if str(grid) != '1' + '0'*(6-digits) or digits < 0:
+            msg.error("The 'fixed-point-grid' must be a power of ten number of nanometres (1, 10, 100...), not '%s'" % grid)
+        if geometry.GRID_TYPECODE == None:
+            msg.error("The 'fixed-point-grid' needs 64-bit integer arrays, which this Python doesn't have; remove it to use floats")
+        config.cfg['fixed-point-digits'] = digits
+    else:
+        config.cfg['fixed-point-digits'] = None
+
+    #---------------------------------------------------------------
+    # Path database
+    #---------------------------------------------------------------
+    build_dir = os.path.join(config.cfg['locations']['boards'], 
+                             config.cfg['name'],
+                             config.cfg['locations']['build'])
+    utils.create_dir(build_dir)
+
+    # Records are read from the database as they're needed, and only
+    # new ones are written. The backend is 'sqlite' (default) or
+    # 'json', the original single file
+    backend = config.brd['config'].get('path-store') or 'sqlite'
+
+    # Paths that haven't been used for this many days are evicted, as
+    # are the least recently used ones while the database is larger
+    # than this many MB
+    max_age = config.brd['config'].get('path-store-max-age', 180)
+    max_size = config.brd['config'].get('path-store-max-size', 256)
+    if max_size != None:
+        max_size = int(max_size * 1024 * 1024)
+
+    # Boards can share a path cache instead, so that the paths of
+    # footprints they have in common are only processed once. It's
+    # the user's cache directory if 'path-cache' is true, or the
+    # directory it names
+    cache_dir = config.brd['config'].get('path-cache')
+    if cmdline_args.path_cache is not False:
+        cache_dir = cmdline_args.path_cache or True
+    shared = cache_dir not in (None, False)
+    if shared == True:
+        if cache_dir is True:
+            cache_dir = path_store.userCacheDir()
+        build_dir = os.path.expanduser(cache_dir)
+        utils.create_dir(build_dir)
+
+    # Records are kept apart by precision, fixed-point grid and
+    # geometry format, so changing any of these doesn't reuse the
+    # records of another, nor discard them
+    namespace = svgpath.getPathStoreNamespace()
+
+    config.pth = path_store.openPathStore(build_dir, backend, max_age, max_size,
+                                          shared, namespace)
+
+    # Fonts are precompiled, keyed by the hash of their file, next to
+    # the path database, so they're shared the same way
+    font.setCacheDir(os.path.join(build_dir, 'fonts'))
+
+
     # buffer from board outline to display block edge 
     config.cfg['display-frame-buffer'] = config.cfg.get('display_frame_buffer', 1.0)
 
@@ -338,6 +410,18 @@ def makeConfig(name, version, cmdline_args):
     gd['digits'] = config.brd['gerber'].get('digits') or 6
     gd['steps-per-segment'] = config.brd['gerber'].get('steps-per-segment') or 100
     gd['min-segment-length'] = config.brd['gerber'].get('min-segment-length') or 0.05
+    # When set, curves are linearised adaptively so that no line is
+    # further than this from the curve, instead of using the above
+    gd['curve-tolerance'] = config.brd['gerber'].get('curve-tolerance')
+    # When set, curves that are within this of a circular arc are
+    # drawn as arcs (G02/G03)
+    gd['arc-tolerance'] = config.brd['gerber'].get('arc-tolerance')
+    # Polylines can be simplified before they're written; exactly,
+    # with 'collinear', or to within a tolerance, with 'douglas-peucker'
+    gd['simplify'] = config.brd['gerber'].get('simplify')
+    if gd['simplify'] not in [None, False, 'collinear', 'douglas-peucker']:
+        msg.error("Gerber 'simplify' must be 'collinear' or 'douglas-peucker', not '%s'" % gd['simplify'])
+    gd['simplify-tolerance'] = config.brd['gerber'].get('simplify-tolerance') or 0.001
 
     # Inkscape inverts the 'y' axis for some historical reasons.
     # This means that we need to invert it as well. This should
@@ -427,6 +511,10 @@ def main():
     elif cmdline_args.coord_file is not False:
         coord_file.makeCoordFile(cmdline_args.coord_file)
 
+    elif cmdline_args.route_lengths is True:
+        msg.info("Measuring routes")
+        route_lengths.reportRouteLengths()
+
     else:
         # Make the board
         if cmdline_args.make is True:
@@ -451,18 +539,22 @@ def main():
             utils.makePngs()
    
     
-    filename = os.path.join(config.cfg['locations']['boards'], 
-                            config.cfg['name'],
-                            config.cfg['locations']['build'],
-                            'paths_db.json')
-
-    try:
-        f = open(filename, 'w')
-    except IOError as e:
-        print("I/O error({0}): {1}".format(e.errno, e.strerror))
- 
-    json.dump(config.pth, f, sort_keys=True, indent=2)
-    f.close()
+    # Write the paths that were added to the database
+    if cmdline_args.gc_path_db is True:
+        removed, nested = config.pth.collectGarbage()
+        msg.info("Removed %d unused paths, and %d unused transforms, from the path database" % (removed, nested))
+    else:
+        config.pth.commit()
+    config.pth.close()
+
+    # How well the path database did in this run is kept with the
+    # build, and reported if asked for
+    if config.pth.hasStats():
+        config.pth.writeStats(os.path.join(build_dir, 'path_cache_stats.json'))
+        if cmdline_args.cache_stats is True:
+            config.pth.reportStats()
+    elif cmdline_args.cache_stats is True:
+        msg.info("The path database wasn't used")
 
     msg.info("Done!")
 
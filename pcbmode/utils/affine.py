@@ -0,0 +1,142 @@
+#!/usr/bin/python
+
+from math import sin, cos
+from array import array
+
+from .point import DEG2RAD
+
+
+
+class Affine():
+    """
+    A 2D affine transform, i.e., the 3x3 matrix
+
+      | a c e |
+      | b d f |
+      | 0 0 1 |
+
+    which maps (x, y) to (a*x + c*y + e, b*x + d*y + f), the same as
+    SVG's 'matrix(a,b,c,d,e,f)'. Transforms are composed with '*',
+    where (A * B) applies B first and then A.
+    """
+
+    def __init__(self, a=1.0, b=0.0, c=0.0, d=1.0, e=0.0, f=0.0):
+        self.a = a
+        self.b = b
+        self.c = c
+        self.d = d
+        self.e = e
+        self.f = f
+
+
+    def __mul__(self, m):
+        """ compose with transform 'm'; 'm' is applied first """
+        return Affine(self.a*m.a + self.c*m.b,
+                      self.b*m.a + self.d*m.b,
+                      self.a*m.c + self.c*m.d,
+                      self.b*m.c + self.d*m.d,
+                      self.a*m.e + self.c*m.f + self.e,
+                      self.b*m.e + self.d*m.f + self.f)
+
+
+    def __repr__(self):
+        return "matrix(%s,%s,%s,%s,%s,%s)" % (self.a, self.b, self.c,
+                                               self.d, self.e, self.f)
+
+
+    def getKey(self, digits):
+        """
+        Returns a canonical string of the transform, with coefficients
+        rounded to 'digits' decimal digits, for use as a cache key
+        """
+        # Adding 0.0 turns -0.0 into 0.0
+        return ','.join([repr(round(v, digits) + 0.0) for v in (self.a, self.b,
+                                                                self.c, self.d,
+                                                                self.e, self.f)])
+
+
+    def applyToPoint(self, x, y):
+        """ returns the transformed coordinate of (x, y) """
+        return (self.a*x + self.c*y + self.e,
+                self.b*x + self.d*y + self.f)
+
+
+    def isAxisAligned(self):
+        """
+        Returns True if the transform maps horizontal and vertical lines
+        to horizontal and vertical lines, e.g., rotations by multiples
+        of 90 degrees, scaling and mirroring
+        """
+        eps = 1e-12
+        return ((abs(self.b) < eps and abs(self.c) < eps) or
+                (abs(self.a) < eps and abs(self.d) < eps))
+
+
+    def applyToBoundingBox(self, bbox):
+        """
+        Returns the bounding box, as (min_x, min_y, max_x, max_y), of
+        the transformed corners of bounding box 'bbox'. This is the
+        bounding box of the transformed shape only when the transform
+        is axis aligned
+        """
+        min_x, min_y, max_x, max_y = bbox
+        x1, y1 = self.applyToPoint(min_x, min_y)
+        x2, y2 = self.applyToPoint(max_x, max_y)
+        return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+
+    def applyToCoords(self, coords, relative=False):
+        """
+        Transforms a flat buffer of x,y coordinates, such as the
+        coordinates of a PathData, and returns a new array('d'). When
+        'relative' is True the coordinates are treated as offsets, so
+        the translation isn't applied to them.
+        """
+        a, b, c, d = self.a, self.b, self.c, self.d
+        if relative == True:
+            e = f = 0.0
+        else:
+            e, f = self.e, self.f
+
+        xs = coords[0::2]
+        ys = coords[1::2]
+
+        out = array('d', coords)
+        out[0::2] = array('d', [a*x + c*y + e for x, y in zip(xs, ys)])
+        out[1::2] = array('d', [b*x + d*y + f for x, y in zip(xs, ys)])
+
+        return out
+
+
+
+
+def rotation(angle):
+    """
+    Returns a rotation by 'angle' degrees around the origin, in the
+    same direction as Point.rotate()
+    """
+    rad = angle * DEG2RAD
+    return Affine(cos(rad), -sin(rad), sin(rad), cos(rad))
+
+
+
+def scaling(x, y=None):
+    """
+    Returns a scaling by 'x' horizontally and 'y' (default: 'x')
+    vertically
+    """
+    if y == None:
+        y = x
+    return Affine(float(x), 0.0, 0.0, float(y))
+
+
+
+def translation(x, y):
+    """ returns a translation by (x, y) """
+    return Affine(1.0, 0.0, 0.0, 1.0, float(x), float(y))
+
+
+
+def mirroring():
+    """ returns a horizontal mirroring, i.e., over the 'y' axis """
+    return Affine(-1.0, 0.0, 0.0, 1.0)
@@ -10,6 +10,7 @@ from . import messages as msg
 # pcbmode modules
 from . import utils
 from .point import Point
+from .geometry import toGrid, gridToString
 
 
 
@@ -164,6 +165,14 @@ class Excellon():
         """
         Converts a Point type into an Excellon coordinate
         """
+        # On the fixed-point grid coordinates are written exactly. As
+        # with floats, the decimal point is always written, since
+        # without it the header's format would apply
+        digits = config.cfg.get('fixed-point-digits')
+        if digits != None:
+            return "X%sY%s\n" % (gridToString(toGrid(point.x, digits), digits, True),
+                                  gridToString(toGrid(-point.y, digits), digits, True))
+
         return "X%.6fY%.6f\n" % (point.x, -point.y)
 
 
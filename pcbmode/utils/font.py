@@ -0,0 +1,259 @@
+#!/usr/bin/python
+
+import os
+import json
+import errno
+import struct
+import hashlib
+from lxml import etree as et
+
+from pkg_resources import resource_exists, resource_filename
+
+import pcbmode.config as config
+from . import messages as msg
+from .geometry import (parsePathData, relativePathData, absolutePathData,
+                       pathDataBoundingBox, packPathData, unpackPathData,
+                       GEOMETRY_FORMAT)
+from .path_store import writeAtomically
+
+
+
+# Fonts that were loaded in this process, by filename
+_fonts = {}
+
+# Where precompiled fonts are kept, if anywhere. This is set once,
+# with setCacheDir(), when the board's configuration is made
+_cache_dir = None
+
+# Version of the precompiled font format; bump it when it changes
+_FONT_FORMAT = 2
+
+# A precompiled font starts with the length of its JSON header
+_HEADER_LENGTH = struct.Struct('<I')
+
+
+
+
+def setCacheDir(cache_dir):
+    """
+    Sets the directory that precompiled fonts are kept in; None keeps
+    them in memory only
+    """
+    global _cache_dir
+    _cache_dir = cache_dir
+
+
+
+
+def getFont(name):
+    """
+    Returns the Font of font family 'name'. The font's SVG is looked
+    for in the project's fonts directory and then in PCBmodE's, and is
+    only loaded the first time it's asked for.
+    """
+
+    font_filename = "%s.svg" % name
+
+    # Search for the font SVG in these paths
+    paths = [os.path.join(config.cfg['base-dir'],
+                          config.cfg['locations']['fonts'],
+                          font_filename)]
+
+    font_resource = ('pcbmode', '/'.join(['fonts', font_filename]))
+    if resource_exists(*font_resource):
+        paths.append(resource_filename(*font_resource))
+
+    for filename in paths:
+        font = _fonts.get(filename)
+        if font != None:
+            return font
+        if os.path.isfile(filename):
+            font = Font(name, filename)
+            _fonts[filename] = font
+            return font
+
+    msg.error("Couldn't find font file %s. Looked for it here:\n%s" % (font_filename, ''.join("  %s \n" % path for path in paths)))
+
+
+
+
+class Font():
+    """
+    An SVG font: its metrics, and its glyphs indexed by their unicode
+    symbol. A glyph is a dict of its 'relative' PathData and its
+    'bounding-box' (both None for glyphs that aren't drawn, like a
+    space), its horizontal 'advance' and its 'gerber-lp'.
+
+    Fonts are precompiled into the cache directory (see setCacheDir())
+    under the hash of the font file, so that later runs load the
+    glyphs' paths ready-made instead of parsing the SVG and its paths.
+    """
+
+    def __init__(self, name, filename):
+
+        self._name = name
+        self._filename = filename
+
+        # Glyph paths are made the way SvgPath makes them, on the
+        # fixed-point grid if there is one
+        self._digits = config.cfg.get('fixed-point-digits')
+
+        with open(filename, 'rb') as f:
+            svg_data = f.read()
+
+        compiled_filename = None
+        if _cache_dir != None:
+            key = "%d-%d-%s-" % (_FONT_FORMAT, GEOMETRY_FORMAT, self._digits)
+            digest = hashlib.sha1(key.encode() + svg_data).hexdigest()
+            compiled_filename = os.path.join(_cache_dir, "%s-%s.font" % (name, digest))
+
+        if compiled_filename != None and os.path.isfile(compiled_filename):
+            with open(compiled_filename, 'rb') as f:
+                self._loadCompiled(f.read())
+        else:
+            self._loadSvg(svg_data)
+            if compiled_filename != None:
+                # Parallel builds may be making the directory too
+                try:
+                    os.makedirs(_cache_dir)
+                except OSError as e:
+                    if e.errno != errno.EEXIST:
+                        raise
+                writeAtomically(compiled_filename, self._compile())
+
+
+
+
+    def _loadSvg(self, svg_data):
+        """
+        Reads the font from its SVG, in bytes 'svg_data'
+        """
+
+        font_data = et.ElementTree(et.fromstring(svg_data))
+        ns = {'n': config.cfg['namespace']['svg']}
+
+        font = font_data.find(".//n:font", namespaces=ns)
+        font_face = font_data.find(".//n:font-face", namespaces=ns)
+
+        # This the horizontal advance that applies to all glyphs
+        # unless there's a specification for the glyph itself
+        self._horiz_adv_x = float(font.get('horiz-adv-x'))
+
+        # This is the number if 'units' per 'em'. The default, in the
+        # absence of a definition is 1000 according to the SVG spec
+        self._units_per_em = float(font_face.get('units-per-em') or 0) or 1000
+
+        self._ascent = float(font_face.get('ascent'))
+        self._descent = float(font_face.get('descent'))
+
+        self._glyphs = {}
+        for glyph in font_data.iterfind(".//n:glyph", namespaces=ns):
+            symbol = glyph.get('unicode')
+            # Where a symbol has more than one glyph the first is used
+            if symbol == None or symbol in self._glyphs:
+                continue
+            path = glyph.get('d')
+            relative = None
+            bbox = None
+            gerber_lp = glyph.get('gerber-lp') or glyph.get('gerber_lp')
+            if path != None:
+                relative = relativePathData(parsePathData(path, self._digits))
+                bbox = list(pathDataBoundingBox(absolutePathData(relative)))
+                gerber_lp = gerber_lp or 'd' * relative.getNumberOfSegments()
+            self._glyphs[symbol] = {
+                'relative': relative,
+                'bounding-box': bbox,
+                'advance': float(glyph.get('horiz-adv-x') or self._horiz_adv_x),
+                'gerber-lp': gerber_lp
+            }
+
+
+
+
+    def _compile(self):
+        """
+        Returns the precompiled font: a JSON header of the metrics and
+        glyphs, and then the glyphs' packed paths, which the header
+        refers to by offset
+        """
+
+        paths = []
+        size = 0
+        glyphs = {}
+        for symbol, glyph in self._glyphs.items():
+            offset = None
+            if glyph['relative'] != None:
+                packed = packPathData(glyph['relative'])
+                paths.append(packed)
+                offset = size
+                size += len(packed)
+            glyphs[symbol] = {'relative': offset,
+                              'bounding-box': glyph['bounding-box'],
+                              'advance': glyph['advance'],
+                              'gerber-lp': glyph['gerber-lp']}
+
+        header = json.dumps({'horiz-adv-x': self._horiz_adv_x,
+                             'units-per-em': self._units_per_em,
+                             'ascent': self._ascent,
+                             'descent': self._descent,
+                             'glyphs': glyphs}, sort_keys=True).encode('utf-8')
+
+        return b''.join([_HEADER_LENGTH.pack(len(header)), header] + paths)
+
+
+
+
+    def _loadCompiled(self, data):
+        """
+        Reads the font from bytes 'data' of a precompiled font
+        """
+
+        length, = _HEADER_LENGTH.unpack_from(data)
+        start = _HEADER_LENGTH.size
+        header = json.loads(data[start:start+length].decode('utf-8'))
+        start += length
+
+        self._horiz_adv_x = header['horiz-adv-x']
+        self._units_per_em = header['units-per-em']
+        self._ascent = header['ascent']
+        self._descent = header['descent']
+
+        self._glyphs = {}
+        for symbol, glyph in header['glyphs'].items():
+            if glyph['relative'] != None:
+                glyph['relative'] = unpackPathData(data, start + glyph['relative'])
+            self._glyphs[symbol] = glyph
+
+
+
+
+    def getName(self):
+        return self._name
+
+
+    def getFilename(self):
+        return self._filename
+
+
+    def getGlyph(self, symbol):
+        """
+        Returns the glyph of unicode 'symbol', or None if the font
+        doesn't have one
+        """
+        return self._glyphs.get(symbol)
+
+
+    def getHorizAdvX(self):
+        return self._horiz_adv_x
+
+
+    def getUnitsPerEm(self):
+        return self._units_per_em
+
+
+    def getAscent(self):
+        return self._ascent
+
+
+    def getDescent(self):
+        return self._descent
@@ -0,0 +1,1409 @@
+#!/usr/bin/python
+
+import re
+import sys
+import struct
+from array import array
+from math import sqrt, ceil, hypot, cos, pi
+from operator import add, sub
+
+import pcbmode.config as config
+from . import messages as msg
+from .point import PointArray
+
+
+
+# Amount of coordinates each SVG path command consumes per repetition
+_COMMAND_ARITY = {'m': 2, 'l': 2, 't': 2,
+                  'h': 1, 'v': 1,
+                  'c': 6, 's': 4, 'q': 4,
+                  'z': 0}
+
+# Typecode of the array of a fixed-point PathData's coordinates, a
+# 64-bit integer. Python 2's array doesn't have 'q', but its 'l' is
+# 64-bit where longs are (e.g., 64-bit Linux and OS X)
+GRID_TYPECODE = None
+for _typecode in ('q', 'l'):
+    try:
+        if array(_typecode).itemsize == 8:
+            GRID_TYPECODE = _typecode
+            break
+    except ValueError:
+        pass
+
+# A single regex that splits an SVG path into command letters and
+# numbers; anything else (other than whitespace and commas) ends up in
+# the third group and is reported as an error. This is compiled once
+# per process and shared by all paths.
+_PATH_TOKENS = re.compile(r"([MmLlHhVvCcSsQqTtZz])|"
+                          r"([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)|"
+                          r"([^\s,])")
+
+
+
+
+class PathData():
+    """
+    A compact representation of an SVG path: an array of command codes,
+    one for each path segment, and a flat buffer of float coordinates
+    that the commands consume in order. An 'm x,y l x,y x,y' path is
+    stored as the commands 'm', 'l', 'l' and six coordinates.
+
+    If 'digits' is set the path is in fixed-point: coordinates are
+    64-bit integers, array(GRID_TYPECODE), on a grid of 10^-'digits'.
+    Otherwise they are floats, array('d').
+    """
+
+    def __init__(self, cmds=None, coords=None, digits=None):
+        if cmds is None:
+            cmds = array('B')
+        if coords is None:
+            coords = array(('d', GRID_TYPECODE)[digits is not None])
+        self.cmds = cmds
+        self.coords = coords
+        self.digits = digits
+
+
+    def copy(self):
+        return PathData(array('B', self.cmds), array(self.coords.typecode, self.coords),
+                        self.digits)
+
+
+    def getNumberOfSegments(self):
+        """
+        Returns the amount of sub-paths, i.e., 'move to' commands
+        """
+        return self.cmds.count(_m) + self.cmds.count(_M)
+
+
+    def getFirstPoint(self):
+        if self.digits is not None:
+            return [fromGrid(self.coords[0], self.digits),
+                    fromGrid(self.coords[1], self.digits)]
+        return [self.coords[0], self.coords[1]]
+
+
+    def setFirstPoint(self, x, y):
+        """
+        Sets the coordinate of the first 'move to', which is made
+        absolute, 'M', so that the path can be appended to another
+        """
+        if self.digits is not None:
+            x = toGrid(x, self.digits)
+            y = toGrid(y, self.digits)
+        self.cmds[0] = _M
+        self.coords[0] = x
+        self.coords[1] = y
+
+
+    def __str__(self):
+        return pathDataToString(self)
+
+
+
+
+# Command codes, as stored in PathData
+_M, _L, _H, _V, _C, _S, _Q, _T, _Z = [ord(c) for c in 'MLHVCSQTZ']
+_m, _l, _h, _v, _c, _s, _q, _t, _z = [ord(c) for c in 'mlhvcsqtz']
+
+# Coordinates consumed by each command code
+_ARITY = [0] * 128
+for _cmd, _arity in _COMMAND_ARITY.items():
+    _ARITY[ord(_cmd)] = _arity
+    _ARITY[ord(_cmd.upper())] = _arity
+
+
+
+
+def parsePathData(path, digits=None):
+    """
+    Tokenises an SVG path string directly into a PathData. Implicitly
+    repeated commands are expanded to one command code per segment;
+    coordinates following a 'move to' become 'line to' commands, as
+    the SVG spec defines. If 'digits' is given the PathData is in
+    fixed-point on a grid of 10^-'digits'.
+    """
+
+    cmds = array('B')
+    coords = array('d')
+
+    code = None
+    count = 0
+
+    for letter, number, junk in _PATH_TOKENS.findall(path):
+        if number:
+            if code is None:
+                msg.error("SVG path must start with a command, found '%s'" % number)
+            coords.append(float(number))
+            count += 1
+        elif letter:
+            if code is not None:
+                _addCommandCodes(cmds, code, count)
+            code = ord(letter)
+            count = 0
+        else:
+            msg.error("Found an unsupported SVG path command '%s'" % junk)
+
+    if code is not None:
+        _addCommandCodes(cmds, code, count)
+
+    if digits is not None:
+        coords = array(GRID_TYPECODE, [toGrid(v, digits) for v in coords])
+
+    return PathData(cmds, coords, digits)
+
+
+
+
+def _addCommandCodes(cmds, code, count):
+    """
+    Adds the command codes for 'count' coordinates of command 'code'
+    """
+
+    arity = _ARITY[code]
+
+    if arity == 0:
+        if count > 0:
+            msg.error("SVG path command '%s' does not take coordinates" % chr(code))
+        cmds.append(code)
+        return
+
+    if count == 0 or count % arity != 0:
+        msg.error("SVG path command '%s' has %d coordinates; expected a multiple of %d" % (chr(code), count, arity))
+
+    repeat = count // arity
+    if code == _M:
+        cmds.append(_M)
+        cmds.extend([_L] * (repeat-1))
+    elif code == _m:
+        cmds.append(_m)
+        cmds.extend([_l] * (repeat-1))
+    else:
+        cmds.extend([code] * repeat)
+
+
+
+
+def relativePathData(data):
+    """
+    Returns a copy of 'data' that uses only relative commands. As with
+    any SVG path, the coordinate of the first 'move to' is absolute.
+    """
+
+    c = _floatCoords(data)
+    cmds = array('B')
+    coords = array('d')
+
+    # current point and start of current sub-path
+    x = y = sx = sy = 0.0
+    i = 0
+
+    for n, code in enumerate(data.cmds):
+
+        arity = _ARITY[code]
+
+        # Lowercase commands are relative; keep them as they are
+        if code & 32:
+            cmds.append(code)
+            coords.extend(c[i:i+arity])
+
+            if code == _m:
+                if n == 0:
+                    x, y = c[i], c[i+1]
+                else:
+                    x += c[i]
+                    y += c[i+1]
+                sx, sy = x, y
+            elif code == _h:
+                x += c[i]
+            elif code == _v:
+                y += c[i]
+            elif code == _z:
+                x, y = sx, sy
+            elif arity > 0:
+                x += c[i+arity-2]
+                y += c[i+arity-1]
+
+        else:
+            cmds.append(code | 32)
+
+            if code == _H:
+                coords.append(c[i] - x)
+                x = c[i]
+            elif code == _V:
+                coords.append(c[i] - y)
+                y = c[i]
+            elif code == _Z:
+                x, y = sx, sy
+            else:
+                if n == 0:
+                    coords.extend((c[i], c[i+1]))
+                else:
+                    for j in range(i, i+arity, 2):
+                        coords.extend((c[j] - x, c[j+1] - y))
+                x, y = c[i+arity-2], c[i+arity-1]
+                if code == _M:
+                    sx, sy = x, y
+
+        i += arity
+
+    return PathData(cmds, _onGrid(coords, data.digits), data.digits)
+
+
+
+
+def absolutePathData(data):
+    """
+    Returns an absolute copy of 'data' that uses only the 'M', 'L',
+    'C' and 'Z' commands. Horizontal and vertical lines become lines,
+    and smooth and quadratic curves become the equivalent cubic
+    curves. This is the form that measuring and linearising works on.
+    """
+
+    c = _floatCoords(data)
+    cmds = array('B')
+    coords = array('d')
+
+    # current point and start of current sub-path
+    x = y = sx = sy = 0.0
+
+    # Last control point of the previous command, and whether that
+    # command was a cubic or a quadratic curve. This is needed for
+    # reflecting the control point of 's' and 't' commands
+    cx = cy = 0.0
+    last_curve = None
+
+    i = 0
+
+    for n, code in enumerate(data.cmds):
+
+        lower = code | 32
+        if code & 32 and n > 0:
+            ox, oy = x, y
+        else:
+            ox = oy = 0.0
+
+        curve = None
+
+        if lower == _m:
+            x = sx = ox + c[i]
+            y = sy = oy + c[i+1]
+            cmds.append(_M)
+            coords.extend((x, y))
+            i += 2
+        elif lower == _l:
+            x = ox + c[i]
+            y = oy + c[i+1]
+            cmds.append(_L)
+            coords.extend((x, y))
+            i += 2
+        elif lower == _h:
+            x = ox + c[i]
+            cmds.append(_L)
+            coords.extend((x, y))
+            i += 1
+        elif lower == _v:
+            y = oy + c[i]
+            cmds.append(_L)
+            coords.extend((x, y))
+            i += 1
+        elif lower == _c or lower == _s:
+            if lower == _c:
+                x1 = ox + c[i]
+                y1 = oy + c[i+1]
+                i += 2
+            elif last_curve == _c:
+                x1 = 2*x - cx
+                y1 = 2*y - cy
+            else:
+                x1, y1 = x, y
+            cx = ox + c[i]
+            cy = oy + c[i+1]
+            ex = ox + c[i+2]
+            ey = oy + c[i+3]
+            i += 4
+            cmds.append(_C)
+            coords.extend((x1, y1, cx, cy, ex, ey))
+            x, y = ex, ey
+            curve = _c
+        elif lower == _q or lower == _t:
+            if lower == _q:
+                cx = ox + c[i]
+                cy = oy + c[i+1]
+                i += 2
+            elif last_curve == _q:
+                cx = 2*x - cx
+                cy = 2*y - cy
+            else:
+                cx, cy = x, y
+            ex = ox + c[i]
+            ey = oy + c[i+1]
+            i += 2
+            # Exact conversion of a quadratic Bezier into a cubic one
+            cmds.append(_C)
+            coords.extend((x + 2.0/3*(cx-x), y + 2.0/3*(cy-y),
+                           ex + 2.0/3*(cx-ex), ey + 2.0/3*(cy-ey),
+                           ex, ey))
+            x, y = ex, ey
+            curve = _q
+        elif lower == _z:
+            x, y = sx, sy
+            cmds.append(_Z)
+        else:
+            msg.error("Found an unsupported SVG path command '%s'" % chr(code))
+
+        last_curve = curve
+
+    return PathData(cmds, _onGrid(coords, data.digits), data.digits)
+
+
+
+
+def transformPathData(data, matrix, origin=None):
+    """
+    Applies the rotation, scaling and mirroring of Affine 'matrix' to
+    relative PathData 'data' and returns the result; being relative,
+    the matrix's translation doesn't apply. If 'origin' is given, as
+    [x, y], it is subtracted from the first, absolute, coordinate so
+    that the path is placed relative to it. Horizontal and vertical
+    lines are converted to lines since they may not stay such.
+    """
+
+    c = _floatCoords(data)
+
+    if _h in data.cmds or _v in data.cmds:
+        cmds = array('B')
+        coords = array('d')
+        i = 0
+        for code in data.cmds:
+            arity = _ARITY[code]
+            if code == _h:
+                cmds.append(_l)
+                coords.extend((c[i], 0.0))
+            elif code == _v:
+                cmds.append(_l)
+                coords.extend((0.0, c[i]))
+            else:
+                cmds.append(code)
+                coords.extend(c[i:i+arity])
+            i += arity
+    else:
+        cmds = array('B', data.cmds)
+        coords = array('d', c)
+
+    if origin is not None:
+        if data.digits is not None:
+            origin = [toGrid(v, data.digits) for v in origin]
+        coords[0] -= origin[0]
+        coords[1] -= origin[1]
+
+    # The whole coordinate buffer is transformed in one go
+    coords = matrix.applyToCoords(coords, relative=True)
+
+    return PathData(cmds, _onGrid(coords, data.digits), data.digits)
+
+
+
+
+def translatePathData(data, dx, dy):
+    """
+    Returns relative PathData 'data' moved by 'dx' and 'dy'. Being
+    relative, only its first, absolute, coordinate changes
+    """
+    data = data.copy()
+    if data.digits is not None:
+        dx = toGrid(dx, data.digits)
+        dy = toGrid(dy, data.digits)
+    data.coords[0] += dx
+    data.coords[1] += dy
+    return data
+
+
+
+
+def mirrorPathData(data):
+    """
+    Returns a relative PathData mirrored over the 'y' axis, i.e., with
+    the sign of all 'x' coordinates flipped
+    """
+
+    c = _floatCoords(data)
+    coords = array('d', c)
+
+    i = 0
+    for code in data.cmds:
+        arity = _ARITY[code]
+        if code == _h:
+            coords[i] = -c[i]
+        elif code != _v:
+            for j in range(i, i+arity, 2):
+                coords[j] = -c[j]
+        i += arity
+
+    return PathData(array('B', data.cmds), _onGrid(coords, data.digits),
+                    data.digits)
+
+
+
+
+def pathDataBoundingBox(data):
+    """
+    Returns the exact bounding box, as (min_x, min_y, max_x, max_y), of
+    an absolute PathData as returned by absolutePathData(). A curve
+    only extends beyond its end points where its derivative is zero,
+    so only those points are evaluated.
+    """
+
+    c = _floatCoords(data)
+
+    if len(c) < 2:
+        return 0.0, 0.0, 0.0, 0.0
+
+    xs = [c[0]]
+    ys = [c[1]]
+    x = y = 0.0
+
+    i = 0
+    for code in data.cmds:
+        if code == _C:
+            x1, y1, x2, y2, x3, y3 = c[i:i+6]
+            for t in _cubicBezierExtrema(x, x1, x2, x3):
+                xs.append(_cubicBezierAt(x, x1, x2, x3, t))
+            for t in _cubicBezierExtrema(y, y1, y2, y3):
+                ys.append(_cubicBezierAt(y, y1, y2, y3, t))
+            x = x3
+            y = y3
+            i += 6
+        elif code != _Z:
+            x = c[i]
+            y = c[i+1]
+            i += 2
+        else:
+            continue
+        xs.append(x)
+        ys.append(y)
+
+    if data.digits is not None:
+        return tuple([fromGrid(v, data.digits) for v in (min(xs), min(ys),
+                                                         max(xs), max(ys))])
+
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+
+
+def _cubicBezierExtrema(p0, p1, p2, p3):
+    """
+    Returns the values of 't', between 0 and 1, at which the
+    one-dimensional cubic Bezier 'p0'--'p3' has a local extremum,
+    i.e., the roots of its derivative
+
+      3(1-t)^2(p1-p0) + 6(1-t)t(p2-p1) + 3t^2(p3-p2)
+    """
+
+    a = -p0 + 3*p1 - 3*p2 + p3
+    b = 2 * (p0 - 2*p1 + p2)
+    c = p1 - p0
+
+    if abs(a) < 1e-12:
+        # The derivative is linear (or constant)
+        if abs(b) < 1e-12:
+            return []
+        roots = [-c / b]
+    else:
+        disc = b*b - 4*a*c
+        if disc < 0:
+            return []
+        disc = sqrt(disc)
+        roots = [(-b + disc) / (2*a), (-b - disc) / (2*a)]
+
+    return [t for t in roots if 0 < t < 1]
+
+
+
+
+def _cubicBezierAt(p0, p1, p2, p3, t):
+    """
+    Returns the value of the one-dimensional cubic Bezier 'p0'--'p3'
+    at 't'
+    """
+    u = 1 - t
+    return u*u*u*p0 + 3*u*u*t*p1 + 3*u*t*t*p2 + t*t*t*p3
+
+
+
+
+def pathDataToCoordList(data, steps, length, tolerance=None,
+                        arc_tolerance=None):
+    """
+    Linearises an absolute PathData, as returned by absolutePathData(),
+    into a list of sub-paths, each being a PointArray. If 'tolerance'
+    is given, curves are subdivided until the lines are no further
+    than 'tolerance' from the curve. Otherwise each curve is first
+    sampled at 'steps' points, which are then thinned so that segments
+    are about 'length' long.
+
+    If 'arc_tolerance' is given, curves that are within it of a
+    circular arc aren't linearised; their end point is added to the
+    PointArray's arcs.
+
+    The points of a fixed-point PathData are kept as grid integers,
+    not mm; the curves' points are the only ones that are snapped to
+    the grid.
+    """
+
+    digits = data.digits
+    c = _floatCoords(data)
+
+    # On the grid, lengths and tolerances are in grid units too
+    if digits is not None:
+        scale = 10**digits
+        length *= scale
+        if tolerance:
+            tolerance *= scale
+        if arc_tolerance:
+            arc_tolerance *= scale
+
+    # Curves that are arcs are found, and all the other curves of the
+    # path are linearised, before the path is walked
+    arcs = []
+    curves = array('d')
+    x = y = 0.0
+    i = 0
+    for code in data.cmds:
+        if code == _C:
+            curve = (x, y) + tuple(c[i:i+6])
+            arc = None
+            if arc_tolerance:
+                arc = _cubicBezierToArc(curve, arc_tolerance)
+            arcs.append(arc)
+            if arc is None and not tolerance:
+                curves.extend(curve)
+            x = c[i+4]
+            y = c[i+5]
+            i += 6
+        elif code != _Z:
+            x = c[i]
+            y = c[i+1]
+            i += 2
+    linearised = iter(_linearizeCubicBeziers(curves, steps, length))
+    arcs = iter(arcs)
+
+    sig_dig = config.cfg['significant-digits']
+
+    points = []
+    p = None
+
+    x = y = 0.0
+
+    i = 0
+    for code in data.cmds:
+        if code == _M:
+            x = c[i]
+            y = c[i+1]
+            # A new sub-path is starting after a previous one
+            if p is not None:
+                points.append(_roundPointArray(p, sig_dig, digits))
+            p = PointArray((x,), (y,))
+            i += 2
+        elif code == _L:
+            x = c[i]
+            y = c[i+1]
+            p.append(x, y)
+            i += 2
+        elif code == _C:
+            arc = next(arcs)
+            if arc is not None:
+                p.arcs[len(p)] = arc
+                p.append(c[i+4], c[i+5])
+            elif tolerance:
+                _flattenCubicBezier((x, y, c[i], c[i+1], c[i+2], c[i+3],
+                                     c[i+4], c[i+5]), tolerance, p)
+            else:
+                # The first point is the current point, which is
+                # already in the array
+                xs, ys = next(linearised)
+                p.x.extend(xs)
+                p.y.extend(ys)
+                p.append(c[i+4], c[i+5])
+            x = c[i+4]
+            y = c[i+5]
+            i += 6
+
+    if p is not None:
+        points.append(_roundPointArray(p, sig_dig, digits))
+
+    return points
+
+
+
+
+def _roundPointArray(points, sig_dig, digits=None):
+    """
+    Rounds the coordinates of PointArray 'points', and the centers of
+    its arcs, to 'sig_dig' decimal digits, as a Point's are, or to
+    grid integers if 'digits' is set, and returns it
+    """
+    if digits is not None:
+        points.x = array(GRID_TYPECODE, [int(round(v)) for v in points.x])
+        points.y = array(GRID_TYPECODE, [int(round(v)) for v in points.y])
+        for n, (cx, cy, clockwise) in points.arcs.items():
+            points.arcs[n] = (int(round(cx)), int(round(cy)), clockwise)
+        return points
+
+    points.x = array('d', [round(v, sig_dig) for v in points.x])
+    points.y = array('d', [round(v, sig_dig) for v in points.y])
+    for n, (cx, cy, clockwise) in points.arcs.items():
+        points.arcs[n] = (round(cx, sig_dig), round(cy, sig_dig), clockwise)
+    return points
+
+
+
+
+def _cubicBezierToArc(curve, tolerance):
+    """
+    If the cubic Bezier 'curve', as (x0, y0, x1, y1, x2, y2, x3, y3),
+    is within 'tolerance' of a circular arc, returns the arc's center
+    and whether it is clockwise (with the 'y' axis pointing up), as
+    (center_x, center_y, clockwise). Otherwise, or if the curve is
+    (nearly) straight, returns None.
+    """
+
+    x0, y0, x1, y1, x2, y2, x3, y3 = curve
+
+    # The circle through the curve's ends and middle
+    xm = _cubicBezierAt(x0, x1, x2, x3, 0.5)
+    ym = _cubicBezierAt(y0, y1, y2, y3, 0.5)
+    ax = xm - x0
+    ay = ym - y0
+    bx = x3 - x0
+    by = y3 - y0
+
+    chord = hypot(bx, by)
+    cross = ax*by - ay*bx
+    if chord == 0 or abs(cross) / chord <= tolerance:
+        return None
+
+    a2 = ax*ax + ay*ay
+    b2 = bx*bx + by*by
+    cx = x0 + (by*a2 - ay*b2) / (2*cross)
+    cy = y0 + (ax*b2 - bx*a2) / (2*cross)
+    r = hypot(x0 - cx, y0 - cy)
+
+    for t in (0.125, 0.25, 0.375, 0.625, 0.75, 0.875):
+        x = _cubicBezierAt(x0, x1, x2, x3, t)
+        y = _cubicBezierAt(y0, y1, y2, y3, t)
+        if abs(hypot(x - cx, y - cy) - r) > tolerance:
+            return None
+
+    return cx, cy, cross < 0
+
+
+
+
+def simplifyPolyline(points, decimals, tolerance=None, digits=None):
+    """
+    Returns PointArray 'points' without the points that don't change
+    the polyline once coordinates are rounded to 'decimals' decimal
+    digits: repeated points and points in the middle of straight runs.
+    If 'tolerance' is given, points are also removed (Douglas-Peucker)
+    as long as the polyline stays within 'tolerance' of the original.
+    Arc ends, and the points that arcs start from, are always kept.
+
+    If 'digits' is set the points are integers on a grid of
+    10^-'digits', as pathDataToCoordList() returns them for a
+    fixed-point path, rather than mm.
+    """
+
+    if len(points) < 3:
+        return points
+
+    xs = points.x
+    ys = points.y
+    arcs = points.arcs
+
+    if digits is None:
+        scale = 10 ** decimals
+        grid = list(zip([int(round(x*scale)) for x in xs],
+                        [int(round(y*scale)) for y in ys]))
+    else:
+        grid = list(zip([rescaleGrid(x, digits, decimals) for x in xs],
+                        [rescaleGrid(y, digits, decimals) for y in ys]))
+        if tolerance:
+            tolerance *= 10**digits
+
+    # Exact pass; collinearity is decided on the rounded coordinates
+    kept = [0]
+    for n in range(1, len(grid)):
+        arc = n in arcs
+        if grid[n] == grid[kept[-1]] and not arc:
+            continue
+        while len(kept) > 1 and not arc:
+            b = kept[-1]
+            if b in arcs:
+                break
+            ax, ay = grid[kept[-2]]
+            bx, by = grid[b]
+            cx, cy = grid[n]
+            # 'b' is dropped only if it's between its neighbours
+            if ((bx-ax)*(cy-by) - (by-ay)*(cx-bx) != 0 or
+                (bx-ax)*(cx-bx) + (by-ay)*(cy-by) <= 0):
+                break
+            kept.pop()
+        kept.append(n)
+
+    if tolerance:
+        kept = _douglasPeucker(points, kept, tolerance)
+
+    simplified = PointArray([xs[n] for n in kept], [ys[n] for n in kept],
+                            typecode=xs.typecode)
+    for k, n in enumerate(kept):
+        if n in arcs:
+            simplified.arcs[k] = arcs[n]
+
+    return simplified
+
+
+
+
+def _douglasPeucker(points, indices, tolerance):
+    """
+    Returns the subset of 'indices', into PointArray 'points', that
+    keeps the polyline within 'tolerance' of the one of 'indices'.
+    Arcs, and the point before each, are anchors that are kept.
+    """
+
+    xs = points.x
+    ys = points.y
+
+    anchors = [0]
+    for k in range(1, len(indices)):
+        if indices[k] in points.arcs:
+            if anchors[-1] != k-1:
+                anchors.append(k-1)
+            anchors.append(k)
+    if anchors[-1] != len(indices)-1:
+        anchors.append(len(indices)-1)
+
+    keep = [False] * len(indices)
+    for k in anchors:
+        keep[k] = True
+
+    for first, last in zip(anchors, anchors[1:]):
+        stack = [(first, last)]
+        while stack:
+            first, last = stack.pop()
+            if last - first < 2:
+                continue
+            ax = xs[indices[first]]
+            ay = ys[indices[first]]
+            dx = xs[indices[last]] - ax
+            dy = ys[indices[last]] - ay
+            d2 = dx*dx + dy*dy
+            worst = tolerance
+            split = None
+            for k in range(first+1, last):
+                px = xs[indices[k]] - ax
+                py = ys[indices[k]] - ay
+                # Distance from the segment
+                if d2 == 0:
+                    t = 0
+                else:
+                    t = max(0, min(1, (px*dx + py*dy) / float(d2)))
+                dist = hypot(px - t*dx, py - t*dy)
+                if dist > worst:
+                    worst = dist
+                    split = k
+            if split is not None:
+                keep[split] = True
+                stack.append((first, split))
+                stack.append((split, last))
+
+    return [indices[k] for k in range(len(indices)) if keep[k]]
+
+
+
+
+# Bernstein weights of the cubic Bezier at 'steps' equal steps of
+# 't', by 'steps'
+_bernstein_tables = {}
+
+def _getBernsteinTable(steps):
+    """
+    Returns a list of the 'steps'+1 (b0, b1, b2, b3) Bernstein weights
+    of a cubic Bezier for t = 0, 1/steps, ..., 1
+    """
+    table = _bernstein_tables.get(steps)
+    if table is None:
+        table = []
+        for n in range(steps+1):
+            t = float(n) / steps
+            u = 1 - t
+            table.append((u*u*u, 3*u*u*t, 3*u*t*t, t*t*t))
+        _bernstein_tables[steps] = table
+    return table
+
+
+
+
+def _linearizeCubicBeziers(curves, steps, length):
+    """
+    Linearises the cubic Beziers given as a flat buffer of (x0, y0,
+    x1, y1, x2, y2, x3, y3) per curve, one curve at a time. Each curve
+    is sampled at 'steps' points, from the shared table of Bernstein
+    weights, which are thinned so that segments are about 'length'
+    long; the curve's length is measured while sampling.
+
+    Returns, for each curve, the 'x' and 'y' samples kept between its
+    start and end points, which aren't included, as a pair of lists.
+    """
+
+    table = _getBernsteinTable(steps)
+
+    result = []
+
+    for i in range(0, len(curves), 8):
+        x0, y0, x1, y1, x2, y2, x3, y3 = curves[i:i+8]
+
+        xs = [a*x0 + b*x1 + c*x2 + d*x3 for a, b, c, d in table]
+        ys = [a*y0 + b*y1 + c*y2 + d*y3 for a, b, c, d in table]
+
+        curve_length = polylineLength(xs, ys)
+
+        if curve_length == 0:
+            segments = 1
+        else:
+            segments = ceil(curve_length / length)
+        skip = int(ceil(steps / segments))
+
+        result.append((xs[skip:steps:skip], ys[skip:steps:skip]))
+
+    return result
+
+
+
+
+def polylineLength(xs, ys):
+    """
+    Returns the length of the polyline through the points of the
+    sequences of coordinates 'xs' and 'ys'
+    """
+    return sum(map(hypot, map(sub, xs[1:], xs[:-1]), map(sub, ys[1:], ys[:-1])))
+
+
+
+
+def pathDataLength(data, tolerance=1e-6):
+    """
+    Returns the length of an absolute PathData, as returned by
+    absolutePathData(); see pathDataLengths()
+    """
+    return pathDataLengths([data], tolerance)[0]
+
+
+
+
+def pathDataLengths(paths, tolerance=1e-6):
+    """
+    Returns the lengths of a list of absolute PathData, as returned
+    by absolutePathData(), in board units even if they're fixed-point.
+    Lines, including the ones that close sub-paths, are measured
+    exactly. The curves of all the paths are measured together, by
+    cubicBezierLengths(), to within about 'tolerance' each.
+    """
+
+    lengths = []
+    curves = array('d')
+    owners = []
+
+    for n, data in enumerate(paths):
+        # Fixed-point paths are measured in board units, like the rest
+        c = _floatCoords(data)
+        if data.digits is not None:
+            c = array('d', [fromGrid(v, data.digits) for v in c])
+        length = 0.0
+        x = y = sx = sy = 0.0
+        i = 0
+        for code in data.cmds:
+            if code == _M:
+                x = sx = c[i]
+                y = sy = c[i+1]
+                i += 2
+            elif code == _L:
+                length += hypot(c[i] - x, c[i+1] - y)
+                x = c[i]
+                y = c[i+1]
+                i += 2
+            elif code == _C:
+                curves.extend((x, y))
+                curves.extend(c[i:i+6])
+                owners.append(n)
+                x = c[i+4]
+                y = c[i+5]
+                i += 6
+            elif code == _Z:
+                length += hypot(sx - x, sy - y)
+                x, y = sx, sy
+        lengths.append(length)
+
+    for n, length in zip(owners, cubicBezierLengths(curves, tolerance)):
+        lengths[n] += length
+
+    return lengths
+
+
+
+
+# Gauss-Legendre nodes and weights, on [0, 1], by order
+_gauss_legendre_tables = {}
+
+def _getGaussLegendreTable(order):
+    """
+    Returns a list of the 'order' (a, b, c) weights of the derivative
+    of a cubic Bezier, with the Gauss-Legendre weight of the node
+    folded in. The derivative at the node is (a, b, c) times the
+    differences of consecutive control points.
+    """
+
+    table = _gauss_legendre_tables.get(order)
+    if table is not None:
+        return table
+
+    table = []
+    for k in range(1, order+1):
+        # Newton's method for the k'th root of the Legendre polynomial
+        x = cos(pi * (k - 0.25) / (order + 0.5))
+        for _ in range(100):
+            p0, p1 = 1.0, x
+            for j in range(2, order+1):
+                p0, p1 = p1, ((2*j - 1)*x*p1 - (j - 1)*p0) / j
+            dp = order * (x*p1 - p0) / (x*x - 1)
+            dx = p1 / dp
+            x -= dx
+            if abs(dx) < 1e-15:
+                break
+        w = 1.0 / ((1 - x*x) * dp*dp)
+        t = (1 + x) / 2
+        u = 1 - t
+        table.append((3*w*u*u, 6*w*u*t, 3*w*t*t))
+
+    _gauss_legendre_tables[order] = table
+    return table
+
+
+
+
+# The orders of the two Gauss-Legendre rules that measure a curve;
+# where they disagree, the curve is split in half
+_LENGTH_ORDERS = (8, 16)
+
+# Limits the splitting of curves that are hard to measure, i.e.,
+# those with cusps
+_MAX_LENGTH_DEPTH = 12
+
+def cubicBezierLengths(curves, tolerance=1e-6, depth=0):
+    """
+    Returns the lengths of a batch of cubic Beziers, given as a flat
+    buffer of (x0, y0, x1, y1, x2, y2, x3, y3) per curve. The length
+    is the integral of the curve's speed, evaluated with Gauss-Legendre
+    quadrature for all the curves at once. Curves whose length isn't
+    yet within 'tolerance' are split in half and measured again.
+    """
+
+    if len(curves) == 0:
+        return []
+
+    # Differences of consecutive control points
+    dx0 = list(map(sub, curves[2::8], curves[0::8]))
+    dy0 = list(map(sub, curves[3::8], curves[1::8]))
+    dx1 = list(map(sub, curves[4::8], curves[2::8]))
+    dy1 = list(map(sub, curves[5::8], curves[3::8]))
+    dx2 = list(map(sub, curves[6::8], curves[4::8]))
+    dy2 = list(map(sub, curves[7::8], curves[5::8]))
+
+    estimates = []
+    for order in _LENGTH_ORDERS:
+        lengths = [0.0] * len(dx0)
+        for a, b, c in _getGaussLegendreTable(order):
+            speeds = map(hypot,
+                         [a*p + b*q + c*r for p, q, r in zip(dx0, dx1, dx2)],
+                         [a*p + b*q + c*r for p, q, r in zip(dy0, dy1, dy2)])
+            lengths = list(map(add, lengths, speeds))
+        estimates.append(lengths)
+    coarse, lengths = estimates
+
+    if depth < _MAX_LENGTH_DEPTH:
+        split = [n for n in range(len(lengths))
+                 if abs(lengths[n] - coarse[n]) > tolerance]
+        if split:
+            halves = array('d')
+            for n in split:
+                halves.extend(_splitCubicBezier(curves[n*8:n*8+8]))
+            half_lengths = cubicBezierLengths(halves, tolerance/2, depth+1)
+            for k, n in enumerate(split):
+                lengths[n] = half_lengths[2*k] + half_lengths[2*k+1]
+
+    return lengths
+
+
+
+
+def _splitCubicBezier(curve):
+    """
+    Returns the cubic Bezier 'curve', (x0, y0, x1, y1, x2, y2, x3, y3),
+    split in half (de Casteljau), as the sixteen coordinates of the
+    two halves
+    """
+    x0, y0, x1, y1, x2, y2, x3, y3 = curve
+    x01 = (x0 + x1) / 2
+    y01 = (y0 + y1) / 2
+    x12 = (x1 + x2) / 2
+    y12 = (y1 + y2) / 2
+    x23 = (x2 + x3) / 2
+    y23 = (y2 + y3) / 2
+    xa = (x01 + x12) / 2
+    ya = (y01 + y12) / 2
+    xb = (x12 + x23) / 2
+    yb = (y12 + y23) / 2
+    xm = (xa + xb) / 2
+    ym = (ya + yb) / 2
+    return (x0, y0, x01, y01, xa, ya, xm, ym,
+            xm, ym, xb, yb, x23, y23, x3, y3)
+
+
+
+
+# Limits the subdivision of degenerate, or huge, curves
+_MAX_SUBDIVISION_DEPTH = 16
+
+def _flattenCubicBezier(curve, tolerance, points):
+    """
+    Appends to PointArray 'points' the end points of lines that approximate the
+    cubic Bezier 'curve', given as (x0, y0, x1, y1, x2, y2, x3, y3),
+    to within 'tolerance'. The curve is split in half (de Casteljau)
+    until it is flat enough; the start point isn't appended.
+
+    The flatness test bounds the distance between the curve and its
+    chord by the control points' deviation from where they'd be on a
+    straight line; see Roger Willcocks' "sharp flattening" test.
+    """
+
+    limit = 16 * tolerance * tolerance
+
+    # Curves are taken from the stack in order, so the second half is
+    # pushed first
+    stack = [(curve, 0)]
+    while stack:
+        (x0, y0, x1, y1, x2, y2, x3, y3), depth = stack.pop()
+
+        ux = 3*x1 - 2*x0 - x3
+        uy = 3*y1 - 2*y0 - y3
+        vx = 3*x2 - x0 - 2*x3
+        vy = 3*y2 - y0 - 2*y3
+
+        if (max(ux*ux, vx*vx) + max(uy*uy, vy*vy) <= limit or
+            depth >= _MAX_SUBDIVISION_DEPTH):
+            points.append(x3, y3)
+            continue
+
+        x01 = (x0 + x1) / 2
+        y01 = (y0 + y1) / 2
+        x12 = (x1 + x2) / 2
+        y12 = (y1 + y2) / 2
+        x23 = (x2 + x3) / 2
+        y23 = (y2 + y3) / 2
+        xa = (x01 + x12) / 2
+        ya = (y01 + y12) / 2
+        xb = (x12 + x23) / 2
+        yb = (y12 + y23) / 2
+        xm = (xa + xb) / 2
+        ym = (ya + yb) / 2
+
+        depth += 1
+        stack.append(((xm, ym, xb, yb, x23, y23, x3, y3), depth))
+        stack.append(((x0, y0, x01, y01, xa, ya, xm, ym), depth))
+
+
+
+
+def pathDataToString(data):
+    """
+    Serialises a PathData into a compact SVG path string. Numbers are
+    written as short as they can be (see formatNumber()) and without
+    a separator before a '-'. The command letter is only written when
+    it changes, and a 'line to' that follows a 'move to' is implicit;
+    a 'move to' is always written.
+    """
+
+    try:
+        sig_dig = config.cfg['significant-digits']
+    except KeyError:
+        sig_dig = 8
+
+    # Fixed-point coordinates are written as they are
+    if data.digits is not None:
+        digits = data.digits
+        texts = [_compactNumber(gridToString(v, digits)) for v in data.coords]
+    else:
+        texts = _formatNumbers(data.coords, sig_dig)
+
+    # Each number is written with the separator before it: a comma
+    # before the 'y' of a pair, a space otherwise, and none before
+    # a '-'
+    seps = []
+    for code in data.cmds:
+        seps.extend(_SEPARATORS[_ARITY[code]])
+    texts = [t if t[0] == '-' else sep + t for sep, t in zip(seps, texts)]
+
+    out = []
+    last = None
+
+    i = 0
+    for code in data.cmds:
+        arity = _ARITY[code]
+        if (code != last and not ((last == _m and code == _l) or
+                                  (last == _M and code == _L)) or
+            arity == 0 or code == _m or code == _M):
+            out.append(chr(code))
+            # No separator is needed after a letter
+            if arity > 0:
+                out.append(texts[i].lstrip(' '))
+                out.extend(texts[i+1:i+arity])
+        else:
+            out.extend(texts[i:i+arity])
+        last = code
+        i += arity
+
+    return ''.join(out)
+
+
+
+
+# The separators before the coordinates of a command, by its arity
+_SEPARATORS = {0: (), 1: (' ',), 2: (' ', ','), 4: (' ', ',') * 2,
+               6: (' ', ',') * 3}
+
+
+
+
+def formatNumber(value, digits):
+    """
+    Returns the shortest string that reads back as 'value' rounded to
+    'digits' decimal digits, without redundant zeros, e.g., '.5' for
+    0.5, '-2' for -2.0 and '0' for -0.0
+    """
+
+    # Adding 0.0 turns -0.0 into 0.0
+    value = round(value, digits) + 0.0
+    text = repr(value)
+    if 'e' in text:
+        text = "%.*f" % (digits, value)
+    return _compactNumber(text)
+
+
+
+
+def _formatNumbers(values, digits):
+    """
+    Returns formatNumber() of each of 'values'; the common cases are
+    done a list at a time
+    """
+    texts = [repr(round(v, digits) + 0.0) for v in values]
+    texts = [t[:-2] if t[-2:] == '.0' else t for t in texts]
+    texts = [t[1:] if t[:2] == '0.' else t for t in texts]
+    texts = ['-' + t[2:] if t[:3] == '-0.' else t for t in texts]
+    # Very large and small numbers are in scientific notation
+    if 'e' in ''.join(texts):
+        texts = [formatNumber(v, digits) if 'e' in t else t
+                 for v, t in zip(values, texts)]
+    return texts
+
+
+
+
+def _compactNumber(text):
+    """
+    Removes the redundant zeros of decimal string 'text'
+    """
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    if text.startswith('0.'):
+        return text[1:]
+    if text.startswith('-0.'):
+        return '-' + text[2:]
+    if text == '-0':
+        return '0'
+    return text
+
+
+
+
+# Version of the geometry this module makes: how paths are parsed,
+# normalised and packed. Cached geometry is kept apart by version (see
+# svgpath.getPathStoreNamespace()), so this must be bumped whenever any
+# of these changes the result
+GEOMETRY_FORMAT = 1
+
+# A packed PathData is a header of its 'digits' (_FLOAT_DIGITS for a
+# float path), amount of command codes and amount of coordinates,
+# followed by the command codes and then the coordinates as
+# little-endian float64, or int64 for a fixed-point path
+_PACKED_HEADER = struct.Struct('<BII')
+_FLOAT_DIGITS = 255
+
+
+def packPathData(data):
+    """
+    Returns PathData 'data' as bytes, in a binary form that
+    unpackPathData() reads back without parsing
+    """
+    coords = data.coords
+    if sys.byteorder == 'big':
+        coords = array(coords.typecode, coords)
+        coords.byteswap()
+    digits = data.digits
+    if digits is None:
+        digits = _FLOAT_DIGITS
+    return b''.join((_PACKED_HEADER.pack(digits, len(data.cmds), len(coords)),
+                     _arrayToBytes(data.cmds),
+                     _arrayToBytes(coords)))
+
+
+
+
+def packedPathDataSize(buffer, offset=0):
+    """
+    Returns the size in bytes of the packed PathData at 'offset' in
+    'buffer'
+    """
+    digits, cmd_count, coord_count = _PACKED_HEADER.unpack_from(buffer, offset)
+    return _PACKED_HEADER.size + cmd_count + 8 * coord_count
+
+
+
+
+def unpackPathData(buffer, offset=0):
+    """
+    Returns the PathData packed by packPathData() at 'offset' in
+    'buffer', which can be bytes, a bytearray or an mmap
+    """
+
+    digits, cmd_count, coord_count = _PACKED_HEADER.unpack_from(buffer, offset)
+    if digits == _FLOAT_DIGITS:
+        digits = None
+
+    cmds = array('B')
+    coords = array(('d', GRID_TYPECODE)[digits is not None])
+
+    start = offset + _PACKED_HEADER.size
+    end = start + cmd_count
+    _arrayFromBytes(cmds, bytes(buffer[start:end]))
+    _arrayFromBytes(coords, bytes(buffer[end:end + 8 * coord_count]))
+
+    if sys.byteorder == 'big':
+        coords.byteswap()
+
+    return PathData(cmds, coords, digits)
+
+
+
+
+def _arrayToBytes(values):
+    """
+    Returns the bytes of array 'values'; Python 2's arrays only have
+    tostring()
+    """
+    if hasattr(values, 'tobytes'):
+        return values.tobytes()
+    return values.tostring()
+
+
+
+
+def _arrayFromBytes(values, data):
+    """
+    Appends the items in bytes 'data' to array 'values'; Python 2's
+    arrays only have fromstring()
+    """
+    if hasattr(values, 'frombytes'):
+        values.frombytes(data)
+    else:
+        values.fromstring(data)
+
+
+
+
+def toGrid(value, digits):
+    """
+    Returns 'value' as an integer on a grid of 10^-'digits'
+    """
+    return int(round(value * 10**digits))
+
+
+
+
+def fromGrid(value, digits):
+    """
+    Returns the float of integer 'value' on a grid of 10^-'digits'
+    """
+    return value / float(10**digits)
+
+
+
+
+def rescaleGrid(value, digits, new_digits):
+    """
+    Returns integer 'value' on a grid of 10^-'digits' as an integer on
+    a grid of 10^-'new_digits', rounding halves away from zero, without
+    going through a float
+    """
+    shift = new_digits - digits
+    if shift >= 0:
+        return value * 10**shift
+    q, r = divmod(abs(value), 10**-shift)
+    q += (2*r >= 10**-shift)
+    return (q, -q)[value < 0]
+
+
+
+
+def gridToString(value, digits, fixed=False):
+    """
+    Returns integer 'value' on a grid of 10^-'digits' as a decimal
+    string, e.g., '-1.5' for -1500 with 3 digits, without going
+    through a float. If 'fixed' is set all the 'digits' are written,
+    and so is the decimal point, e.g., '-1.500'.
+    """
+    sign = ('', '-')[value < 0]
+    value = str(abs(value)).rjust(digits+1, '0')
+    integer = value[:len(value)-digits]
+    fraction = value[len(value)-digits:]
+    if not fixed:
+        fraction = fraction.rstrip('0')
+    if fraction or fixed:
+        return "%s%s.%s" % (sign, integer, fraction)
+    return "%s%s" % (sign, integer)
+
+
+
+
+def _floatCoords(data):
+    """
+    Returns the coordinates of PathData 'data' as floats; these are
+    still in grid units if 'data' is fixed-point
+    """
+    if data.digits is None:
+        return data.coords
+    return array('d', data.coords)
+
+
+
+
+def _onGrid(coords, digits):
+    """
+    Returns the coordinates 'coords' as grid integers, if 'digits' is
+    set (the PathData is fixed-point), or as they are otherwise
+    """
+    if digits is None:
+        return coords
+    return array(GRID_TYPECODE, [int(round(v)) for v in coords])
@@ -13,6 +13,7 @@ from . import svg
 from . import utils
 from .svgpath import SvgPath
 from .point import Point
+from .geometry import simplifyPolyline, toGrid, rescaleGrid
 
 
 
@@ -30,6 +31,16 @@ def gerberise(manufacturer='default'):
     digits = gcd['digits'] 
     steps = gcd['steps-per-segment']
     length = gcd['min-segment-length']
+    tolerance = gcd.get('curve-tolerance')
+    arc_tolerance = gcd.get('arc-tolerance')
+
+    # Polylines are simplified exactly ('collinear'), or to within a
+    # tolerance ('douglas-peucker')
+    simplify = gcd.get('simplify')
+    if simplify == 'douglas-peucker':
+        simplify_tolerance = gcd['simplify-tolerance']
+    else:
+        simplify_tolerance = None
 
     # Get layer data
     xpath_regex = ""
@@ -78,7 +89,11 @@ def gerberise(manufacturer='default'):
                                 decimals,
                                 digits,
                                 steps,
-                                length)
+                                length,
+                                tolerance,
+                                arc_tolerance,
+                                simplify,
+                                simplify_tolerance)
 
                 # Default to .ger extension if undefined
                 try:
@@ -94,6 +109,10 @@ def gerberise(manufacturer='default'):
                     for line in gerber.getGerber():
                         f.write(line)
 
+                if simplify:
+                    msg.subInfo("%s %s: %d vertices, %d after simplification" %
+                                ((pcb_layer, sheet) + gerber.getVertexCounts()))
+
 
     # Process module sheets
     sheets = ['outline', 'documentation']
@@ -108,7 +127,11 @@ def gerberise(manufacturer='default'):
                         decimals,
                         digits,
                         steps,
-                        length)
+                        length,
+                        tolerance,
+                        arc_tolerance,
+                        simplify,
+                        simplify_tolerance)
 
         add = '_%s.%s' % (sheet,
                           filename_info['other'][sheet].get('ext') or 'ger')
@@ -118,6 +141,10 @@ def gerberise(manufacturer='default'):
             for line in gerber.getGerber(False):
                 f.write(line)
 
+        if simplify:
+            msg.subInfo("%s: %d vertices, %d after simplification" %
+                        ((sheet,) + gerber.getVertexCounts()))
+
 
     return ['bullshit']
 
@@ -137,7 +164,11 @@ class Gerber():
                  decimals,
                  digits,
                  steps,
-                 length):
+                 length,
+                 tolerance=None,
+                 arc_tolerance=None,
+                 simplify=None,
+                 simplify_tolerance=None):
         """
         """
 
@@ -150,6 +181,17 @@ class Gerber():
         self._digits = digits
         self._steps = steps
         self._length = length
+        self._tolerance = tolerance
+        self._arc_tolerance = arc_tolerance
+        self._simplify = simplify
+
+        # Digits of the fixed-point grid, if coordinates are on one
+        self._grid_digits = config.cfg.get('fixed-point-digits')
+        self._simplify_tolerance = simplify_tolerance
+
+        # Amount of vertices before and after simplification
+        self._vertices_in = 0
+        self._vertices_out = 0
         self._grammar = self._getGerberGrammar()
 
         self._aperture_list = []
@@ -314,6 +356,17 @@ class Gerber():
 
 
 
+    def getVertexCounts(self):
+        """
+        Returns the amount of path vertices before and after
+        simplification
+        """
+        return self._vertices_in, self._vertices_out
+
+
+
+
+
     def getGerber(self, flashes=True):
         """
         Return the complete Gerber
@@ -404,7 +457,9 @@ class Gerber():
         """
         path = SvgPath(path.get('d'))
         coords = path.getCoordList(self._steps, 
-                                   self._length)
+                                   self._length,
+                                   self._tolerance,
+                                   self._arc_tolerance)
 
         return coords
 
@@ -427,6 +482,16 @@ class Gerber():
         # Create a list of lineat points from the input path
         coords = self._pathToPoints(path)
 
+        if self._simplify:
+            self._vertices_in += sum(len(segment) for segment in coords)
+            coords = [simplifyPolyline(segment,
+                                       self._decimals,
+                                       self._simplify_tolerance,
+                                       self._grid_digits) for segment in coords]
+            self._vertices_out += sum(len(segment) for segment in coords)
+
+        sig_dig = config.cfg['significant-digits']
+
         coord_list = []
 
         # Each 'segment' correspond to a shape within the complete
@@ -435,12 +500,37 @@ class Gerber():
 
             segment_coord_list = []
 
-            text = self._getGerberisedPoint(segment[0],offset)
+            xs = segment.x
+            ys = segment.y
+
+            # The offset is added to the whole segment at once. On the
+            # fixed-point grid the points are grid integers, and so is
+            # the offset
+            if self._grid_digits != None:
+                ox = toGrid(offset.x, self._grid_digits)
+                oy = toGrid(offset.y, self._grid_digits)
+                gx = [x + ox for x in xs]
+                gy = [y + oy for y in ys]
+            else:
+                gx = [round(x + offset.x, sig_dig) for x in xs]
+                gy = [round(y + offset.y, sig_dig) for y in ys]
+
+            text = self._getGerberisedCoord(gx[0], gy[0])
             segment_coord_list.append("G01%sD02*\n" % text)
 
-            for coord in segment[1:]:
-                text = self._getGerberisedPoint(coord,offset)
-                segment_coord_list.append("G01%sD01*\n" % text)
+            for n in range(1, len(xs)):
+                text = self._getGerberisedCoord(gx[n], gy[n])
+                arc = segment.arcs.get(n)
+                if arc != None:
+                    # The arc's center is given as an offset from its
+                    # start. Gerber's 'y' axis is inverted, which also
+                    # reverses the direction of the arc
+                    cx, cy, clockwise = arc
+                    text += "I%sJ%s" % (self._getGerberisedNumber(cx-xs[n-1]),
+                                        self._getGerberisedNumber(ys[n-1]-cy))
+                    segment_coord_list.append("%s%sD01*\n" % (('G02','G03')[clockwise], text))
+                else:
+                    segment_coord_list.append("G01%sD01*\n" % text)
 
             coord_list.append(segment_coord_list)
 
@@ -457,18 +547,45 @@ class Gerber():
         """
  
         # Add offset to coordinate
-        coord += offset
-     
+        x = coord.x + offset.x
+        y = coord.y + offset.y
+        if self._grid_digits != None:
+            x = toGrid(x, self._grid_digits)
+            y = toGrid(y, self._grid_digits)
+        return self._getGerberisedCoord(x, y)
+
+
+
+
+    def _getGerberisedCoord(self, x, y):
+        """
+        Returns the Gerber 'X..Y..' of the coordinate 'x', 'y'
+        """
+        return "X%sY%s" % (self._getGerberisedNumber(x),
+                           self._getGerberisedNumber(-y))
+
+
+
+
+    def _getGerberisedNumber(self, number):
+        """
+        Convert a float to a Gerber number, with the decimal point
+        removed. On the fixed-point grid 'number' is a grid integer.
+        """
+
+        # On the fixed-point grid a number is an integer, which only
+        # needs scaling to the Gerber's decimals
+        if self._grid_digits != None:
+            return "%d" % rescaleGrid(number, self._grid_digits, self._decimals)
+
         # Split to integer and decimal content; the reformatting is required 
         # for floats coming in represented in scientific notation
-        xi, xd = str("%f"%coord.x).split(".")
-        yi, yd = str("%f"%-coord.y).split(".")
-     
+        i, d = str("%f"%number).split(".")
+
         # Pad decimals to required number of digits for Gerber (yuck!)
-        xd = xd.ljust(self._decimals, '0')
-        yd = yd.ljust(self._decimals, '0')
-     
-        return "X%s%sY%s%s" % (xi, xd[:self._decimals], yi, yd[:self._decimals])
+        d = d.ljust(self._decimals, '0')
+
+        return "%s%s" % (i, d[:self._decimals])
 
 
 
@@ -517,6 +634,12 @@ class Gerber():
         pa += self._getParamCommand("MOMM", "mode (MO): millimeters (MM)")
         pa.append("\n")
 
+        # Arcs are drawn with multi quadrant circular interpolation
+        if self._arc_tolerance:
+            pa.append("G04 multi quadrant (G75) circular interpolation *\n")
+            pa.append("G75*\n")
+            pa.append("\n")
+
         pa.append("G04 Aperture definitions *\n")
 
         # Fixed circular aperture used for closed shapes
@@ -0,0 +1,1316 @@
+#!/usr/bin/python
+
+import os
+import json
+import heapq
+import mmap
+import numbers
+import time
+import sqlite3
+import struct
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+from . import messages as msg
+from .geometry import packPathData, packedPathDataSize, unpackPathData
+
+
+
+def _today():
+    """
+    Returns the current day, as days since the epoch, which is the
+    resolution that records' last use is kept at
+    """
+    return int(time.time() // 86400)
+
+
+
+
+def userCacheDir():
+    """
+    Returns the user's path cache directory, which is shared by all
+    the boards that are made by the user on the machine
+    """
+    base = os.environ.get('XDG_CACHE_HOME')
+    if not base and os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA')
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pcbmode')
+
+
+
+
+def _mergeRecords(current, record):
+    """
+    Returns path record 'record' with the nested records (e.g.,
+    transforms) of 'current', the same path's record as another
+    process wrote it, that it doesn't have
+    """
+    merged = dict(current)
+    merged.update(record)
+    return merged
+
+
+
+
+class _FileLock():
+    """
+    An exclusive lock on lock file 'filename', which is held in a
+    'with' block. Processes wait for each other to release it.
+    """
+
+    def __init__(self, filename):
+        self._file = open(filename, 'a')
+
+
+    def __enter__(self):
+        if fcntl != None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+
+    def __exit__(self, *exc_info):
+        if fcntl != None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+    def close(self):
+        self._file.close()
+
+
+
+
+def _getFileStamp(filename):
+    """
+    Returns what identifies the current version of file 'filename',
+    its inode, size and modification time, or None if there's no such
+    file
+    """
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime)
+
+
+
+
+# Renames a file over another, atomically. Python 2 doesn't have
+# os.replace(), but there os.rename() does the same on POSIX
+_replace = getattr(os, 'replace', os.rename)
+
+
+
+
+# A JSON path database's journal is compacted once it's larger than
+# this, or than the database, whichever is larger
+_MIN_COMPACT_SIZE = 1024 * 1024
+
+
+
+
+def writeAtomically(filename, data):
+    """
+    Writes 'data', text or bytes, to 'filename' through a temporary
+    file that is then renamed over it, so readers never see a partly
+    written file
+    """
+
+    directory, name = os.path.split(filename)
+    fd, temp_filename = tempfile.mkstemp(prefix=name + '.', suffix='.tmp',
+                                         dir=directory or '.')
+    try:
+        with os.fdopen(fd, ('w', 'wb')[isinstance(data, bytes)]) as f:
+            f.write(data)
+        _replace(temp_filename, filename)
+    except:
+        os.remove(temp_filename)
+        raise
+
+
+
+
+class GeometryFile():
+    """
+    An append-only file of packed PathData (see packPathData()), which
+    is memory-mapped for reading, so that a path is read by unpacking
+    it where it lies rather than by parsing. Any number of processes
+    can add paths to the same file, which is only opened when it's
+    first used. Without a 'filename' the paths are kept in memory.
+
+    The file starts with a header of its generation, which changes
+    each time the file is compacted, by compact(), into a new file
+    of only the paths that are still used. Paths are referred to by
+    their generation and offset in the file, as a single integer, so
+    that a reference from before the file was compacted, which a
+    record may still have, isn't taken for another path.
+    """
+
+    def __init__(self, filename=None, stats=None):
+        self._filename = filename
+        self._map = None
+        self._fd = None
+        self._lock = None
+        self._generation = 0
+        # Where the bytes added and read are counted, if anywhere
+        self._stats = stats
+        if filename == None:
+            self._buffer = bytearray()
+
+
+    def _open(self, locked=False):
+        """
+        Opens the file, or the new one if it was compacted since it
+        was opened, and reads its generation. A file without a header,
+        e.g., one made by an older version, is started anew. 'locked'
+        is True if the lock is already held.
+        """
+
+        if self._lock == None:
+            self._lock = _FileLock(self._filename + '.lock')
+
+        self._closeFile()
+        self._fd = os.open(self._filename, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+
+        if self._readHeader() == False:
+            if locked == True:
+                self._startFile()
+            else:
+                with self._lock:
+                    self._startFile()
+
+
+    def _readHeader(self):
+        """
+        Reads the file's generation; returns False if it has no header
+        """
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        header = os.read(self._fd, _GEOMETRY_HEADER.size)
+        if len(header) < _GEOMETRY_HEADER.size:
+            return False
+        magic, generation = _GEOMETRY_HEADER.unpack(header)
+        if magic != _GEOMETRY_MAGIC:
+            return False
+        self._generation = generation
+        return True
+
+
+    def _startFile(self):
+        """
+        Empties the file and writes the header of its first
+        generation, unless another process just did; the lock must be
+        held
+        """
+        if self._readHeader() == True:
+            return
+        os.ftruncate(self._fd, 0)
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, _GEOMETRY_HEADER.pack(_GEOMETRY_MAGIC, 1))
+        self._generation = 1
+
+
+    def _isReplaced(self):
+        """
+        Returns True if the file was compacted, and so replaced, since
+        it was opened
+        """
+        try:
+            return os.stat(self._filename).st_ino != os.fstat(self._fd).st_ino
+        except OSError:
+            return True
+
+
+    def add(self, data):
+        """
+        Adds PathData 'data' to the file and returns its reference
+        """
+
+        packed = packPathData(data)
+
+        if self._stats != None:
+            self._stats['bytes-written'] += len(packed)
+
+        if self._filename == None:
+            offset = len(self._buffer)
+            self._buffer += packed
+            return offset
+
+        if self._fd == None:
+            self._open()
+
+        with self._lock:
+            if self._isReplaced():
+                self._open(locked=True)
+            offset = os.lseek(self._fd, 0, os.SEEK_END)
+            os.write(self._fd, packed)
+
+        return _makeGeometryRef(self._generation, offset)
+
+
+    def get(self, ref):
+        """
+        Returns the PathData that 'ref' refers to, or None if it's from
+        a generation of the file that was compacted away
+        """
+
+        if self._filename == None:
+            buffer = self._buffer
+            offset = ref
+        else:
+            offset = self._locate(ref)
+            if offset == None:
+                return None
+            buffer = self._map
+
+        if self._stats != None:
+            self._stats['bytes-loaded'] += packedPathDataSize(buffer, offset)
+
+        return unpackPathData(buffer, offset)
+
+
+    def getSize(self, ref):
+        """
+        Returns the size in bytes of the path that 'ref' refers to, or
+        0 if it's from a generation that was compacted away
+        """
+
+        if self._filename == None:
+            return packedPathDataSize(self._buffer, ref)
+
+        offset = self._locate(ref)
+        if offset == None:
+            return 0
+        return packedPathDataSize(self._map, offset)
+
+
+    def _locate(self, ref):
+        """
+        Returns the offset in the map of the path that 'ref' refers
+        to, mapping the file, or mapping it anew if the path was added
+        since it was mapped, or None if 'ref' is from a generation of
+        the file that's gone
+        """
+
+        if self._fd == None:
+            self._open()
+
+        generation, offset = _splitGeometryRef(ref)
+
+        # The reference may have been made, by another process, since
+        # the file was compacted
+        if generation != self._generation and self._isReplaced():
+            self._open()
+        if generation != self._generation:
+            return None
+
+        # Paths added since the file was mapped, by this or by another
+        # process, are past the end of the map
+        if self._map == None or not self._isMapped(offset):
+            if self._map != None:
+                self._map.close()
+            self._map = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ)
+
+        return offset
+
+
+    def _isMapped(self, offset):
+        """
+        Returns True if all of the path at 'offset' is in the map
+        """
+        try:
+            size = packedPathDataSize(self._map, offset)
+        except struct.error:
+            return False
+        return offset + size <= len(self._map)
+
+
+    def getFileSize(self):
+        """
+        Returns the size of the file in bytes
+        """
+        if self._filename == None:
+            return len(self._buffer)
+        try:
+            return os.stat(self._filename).st_size
+        except OSError:
+            return 0
+
+
+    def compact(self, refs):
+        """
+        Replaces the file with one of a new generation that only has
+        the paths of list 'refs', and returns a dict of their old
+        references to their new ones; references from other
+        generations are left out. Paths in memory are never compacted.
+        """
+
+        if self._filename == None:
+            return {}
+
+        if self._fd == None:
+            self._open()
+
+        with self._lock:
+            if self._isReplaced():
+                self._open(locked=True)
+
+            generation = self._generation % _MAX_GEOMETRY_GENERATION + 1
+            data = [_GEOMETRY_HEADER.pack(_GEOMETRY_MAGIC, generation)]
+            size = _GEOMETRY_HEADER.size
+            remap = {}
+            for ref in sorted(set(refs)):
+                offset = self._locate(ref)
+                if offset == None:
+                    continue
+                end = offset + packedPathDataSize(self._map, offset)
+                data.append(self._map[offset:end])
+                remap[ref] = _makeGeometryRef(generation, size)
+                size += end - offset
+
+            # The file can't be replaced while it's open, on Windows
+            if self._map != None:
+                self._map.close()
+                self._map = None
+            try:
+                writeAtomically(self._filename, b''.join(data))
+            except OSError:
+                return {}
+
+            if self._stats != None:
+                self._stats['bytes-written'] += size
+
+        self._open()
+
+        return remap
+
+
+    def _closeFile(self):
+        if self._map != None:
+            self._map.close()
+            self._map = None
+        if self._fd != None:
+            os.close(self._fd)
+            self._fd = None
+
+
+    def close(self):
+        self._closeFile()
+        if self._lock != None:
+            self._lock.close()
+            self._lock = None
+
+
+
+
+# A geometry file starts with this, and its generation
+_GEOMETRY_MAGIC = b'PCBG'
+_GEOMETRY_HEADER = struct.Struct('<4sI')
+
+# A geometry reference is the generation of the file, in the bits
+# above the offset in the file
+_GEOMETRY_OFFSET_BITS = 40
+_MAX_GEOMETRY_GENERATION = 2**22
+
+
+def _makeGeometryRef(generation, offset):
+    return (generation << _GEOMETRY_OFFSET_BITS) | offset
+
+
+def _splitGeometryRef(ref):
+    return ref >> _GEOMETRY_OFFSET_BITS, ref & ((1 << _GEOMETRY_OFFSET_BITS) - 1)
+
+
+
+
+# Keys of records, and of their nested records, whose values are
+# geometry references (see PathStore.addGeometry())
+_GEOMETRY_KEYS = ('relative-data', 'path', 'mirrored')
+
+
+def _getGeometryRefs(record):
+    """
+    Returns the geometry references of 'record' and of its nested
+    records
+    """
+    refs = []
+    for key, value in record.items():
+        if key in _GEOMETRY_KEYS:
+            refs.append(value)
+        elif isinstance(value, dict):
+            refs.extend(value[nested] for nested in _GEOMETRY_KEYS if nested in value)
+    # Records of older formats kept their geometry as text
+    return [ref for ref in refs if isinstance(ref, numbers.Integral)]
+
+
+def _isRemapped(ref, remap):
+    return isinstance(ref, numbers.Integral) and ref in remap
+
+
+def _remapGeometryRefs(record, remap):
+    """
+    Returns a copy of 'record' with its geometry references, and its
+    nested records', that are in dict 'remap' replaced, or None if
+    none of them are
+    """
+    changed = False
+    record = dict(record)
+    for key, value in record.items():
+        if key in _GEOMETRY_KEYS:
+            if _isRemapped(value, remap):
+                record[key] = remap[value]
+                changed = True
+        elif isinstance(value, dict):
+            nested = dict(value)
+            for name in _GEOMETRY_KEYS:
+                if _isRemapped(nested.get(name), remap):
+                    nested[name] = remap[nested[name]]
+                    changed = True
+            record[key] = nested
+    if changed == False:
+        return None
+    return record
+
+
+
+
+# The statistics a PathStore keeps
+_STATS = ('path-hits', 'path-misses',
+          'transform-hits', 'transform-misses',
+          'mirror-hits', 'mirror-misses',
+          'path-miss-seconds', 'transform-miss-seconds',
+          'bytes-loaded', 'bytes-written')
+
+
+
+
+class PathStore():
+    """
+    The path database, config.pth, which maps path digests to their
+    records. Records are read from the backend when they're first
+    asked for, and only the records that were added or changed are
+    written back, by commit(). A record that is changed in place must
+    be set again, 'store[digest] = record', for the change to be
+    written.
+
+    Records refer to their paths' geometry by its reference in the
+    store's GeometryFile, with addGeometry() and getGeometry(), so
+    that records are small and geometry is never parsed. A record's
+    size, which counts towards 'max_size', includes its geometry, and
+    the geometry file is compacted when records are removed from a
+    store it has become much larger than.
+
+    Records are kept in a 'namespace', as the records of the same
+    path differ between, e.g., precisions. The records of all the
+    namespaces are kept side by side in the backend, under keys of
+    'namespace/digest'.
+
+    The store keeps track of the records, and their nested records
+    (e.g., transforms), that are used, with touch(). Records that
+    haven't been used for 'max_age' days are evicted, whatever their
+    namespace, as are the least recently used records while the store
+    is larger than 'max_size' bytes. collectGarbage() removes
+    everything in the namespace that wasn't used in this run.
+
+    Other processes can write to the same store at the same time, for
+    example parallel builds, or other boards when the store is the
+    shared user-level cache ('shared' is True). Changed records are
+    merged with what the other processes wrote when they're written,
+    and collectGarbage() only applies the eviction policy to a shared
+    store, as the paths other boards use aren't known.
+
+    The store counts how well it does, in getStats(): hits and misses,
+    which its users report with addStat(), bytes loaded and written,
+    and the time spent making what wasn't there.
+
+    The backend is only opened once a record is asked for or set, so
+    runs that don't use paths don't touch it at all.
+
+    On its own a PathStore keeps its records in memory only; backends
+    implement _open(), _read(), _write(), _evict(), _removeExcept()
+    and _close().
+    """
+
+    def __init__(self, max_age=None, max_size=None, shared=False, namespace=None):
+        self._records = {}
+        self._dirty = set()
+        # Records that replace what's stored, rather than being merged
+        # with it, because nested records were removed from them
+        self._pruned = set()
+        # Digests used in this run, and the keys of their nested
+        # records that were used
+        self._touched = {}
+        # The day each record read from the backend was last used
+        self._used = {}
+        self._max_age = max_age
+        self._max_size = max_size
+        self._shared = shared
+        self._prefix = ''
+        if namespace != None:
+            self._prefix = namespace + '/'
+        self._stats = dict((name, 0) for name in _STATS)
+        self._geometry = GeometryFile(None, self._stats)
+        self._opened = False
+
+
+    def addStat(self, name, value=1):
+        """
+        Adds 'value' to statistic 'name', one of _STATS
+        """
+        self._stats[name] += value
+
+
+    def getStats(self):
+        """
+        Returns a dict of the store's statistics for this run
+        """
+        return dict(self._stats)
+
+
+    def hasStats(self):
+        """
+        Returns True if the store was used in this run
+        """
+        return any(self._stats[name] for name in _STATS)
+
+
+    def reportStats(self):
+        """
+        Prints the store's statistics for this run
+        """
+
+        stats = self._stats
+
+        msg.info("Path cache statistics")
+        for kind in ('path', 'transform', 'mirror'):
+            hits = stats[kind + '-hits']
+            misses = stats[kind + '-misses']
+            rate = 0
+            if hits + misses > 0:
+                rate = 100.0 * hits / (hits + misses)
+            msg.subInfo("%s records: %d hits, %d misses (%.1f%% hit rate)" % (kind.capitalize(), hits, misses, rate))
+        msg.subInfo("Making missing records: %.3f s for paths, %.3f s for transforms" % (stats['path-miss-seconds'], stats['transform-miss-seconds']))
+        msg.subInfo("Loaded %d bytes, wrote %d bytes" % (stats['bytes-loaded'], stats['bytes-written']))
+
+
+    def writeStats(self, filename):
+        """
+        Writes the store's statistics for this run to JSON file
+        'filename'
+        """
+        with open(filename, 'w') as f:
+            f.write(json.dumps(self._stats, sort_keys=True, indent=2))
+
+
+    def _ensureOpen(self):
+        if self._opened == False:
+            self._open()
+            self._opened = True
+
+
+    def get(self, digest, default=None):
+        self._ensureOpen()
+        key = self._prefix + digest
+        record = self._records.get(key)
+        if record == None:
+            record = self._read(key)
+            if record == None:
+                return default
+            self._records[key] = record
+        self._touch(key)
+        return record
+
+
+    def __getitem__(self, digest):
+        record = self.get(digest)
+        if record == None:
+            raise KeyError(digest)
+        return record
+
+
+    def __setitem__(self, digest, record):
+        self._ensureOpen()
+        key = self._prefix + digest
+        self._records[key] = record
+        self._dirty.add(key)
+        self._touch(key)
+
+
+    def __contains__(self, digest):
+        return self.get(digest) != None
+
+
+    def addGeometry(self, data):
+        """
+        Stores PathData 'data' and returns the reference to it that is
+        kept in records
+        """
+        return self._geometry.add(data)
+
+
+    def getGeometry(self, ref):
+        """
+        Returns the PathData that 'ref' refers to, or None if it's gone
+        since the record that has 'ref' was read, because the geometry
+        was compacted; the record must then be made anew
+        """
+        return self._geometry.get(ref)
+
+
+    def _getSize(self, text, record):
+        """
+        Returns the size of 'record', whose JSON is 'text', and of its
+        geometry
+        """
+        return len(text) + sum(self._geometry.getSize(ref)
+                               for ref in _getGeometryRefs(record))
+
+
+    def _needsCompacting(self, total):
+        """
+        Returns True if the geometry file is much larger than 'total',
+        the size of the store's records and their geometry
+        """
+        return self._geometry.getFileSize() > max(_MIN_COMPACT_SIZE, 2 * total)
+
+
+    def _compactGeometry(self, records):
+        """
+        Compacts the geometry file to the geometry of dict 'records',
+        all of the store's records by digest, and returns a dict of
+        the records whose geometry references changed, as they are
+        now; the backend must write these before its write lock is
+        released
+        """
+        refs = []
+        for record in records.values():
+            refs.extend(_getGeometryRefs(record))
+        remap = self._geometry.compact(refs)
+        changed = {}
+        if len(remap) > 0:
+            for digest, record in records.items():
+                record = _remapGeometryRefs(record, remap)
+                if record != None:
+                    changed[digest] = record
+                    if digest in self._records:
+                        self._records[digest] = record
+        return changed
+
+
+    def touch(self, digest, key=None):
+        """
+        Records that 'digest', and its nested record 'key' if given,
+        were used in this run
+        """
+        self._touch(self._prefix + digest, key)
+
+
+    def _touch(self, digest, key=None):
+        keys = self._touched.get(digest)
+        if keys == None:
+            keys = self._touched[digest] = set()
+        if key != None:
+            keys.add(key)
+
+
+    def commit(self):
+        """
+        Writes the records that were added or changed since the last
+        commit, updates when the used records were last used, and
+        then evicts records according to the store's policy. Nothing
+        is written if nothing changed and all the used records were
+        already used today.
+        """
+
+        today = _today()
+        stale = [digest for digest in self._touched
+                 if digest not in self._dirty and self._used.get(digest, today) < today]
+
+        if len(self._dirty) == 0 and len(stale) == 0:
+            return
+
+        records = dict((digest, self._records[digest]) for digest in self._dirty)
+        self._write(records, stale, today, self._pruned)
+        for digest in list(self._dirty) + stale:
+            self._used[digest] = today
+        self._dirty = set()
+        self._pruned = set()
+
+        if self._max_age != None or self._max_size != None:
+            oldest = None
+            if self._max_age != None:
+                oldest = today - self._max_age
+            evicted = self._evict(oldest, self._max_size, set(self._touched))
+            for digest in evicted:
+                self._records.pop(digest, None)
+            if len(evicted) > 0:
+                msg.info("Evicted %d unused paths from the path database" % len(evicted))
+
+
+    def collectGarbage(self):
+        """
+        Removes the records, and the nested records of the remaining
+        ones, that weren't used in this run. Returns the amount of
+        records and of nested records that were removed.
+        """
+
+        if self._shared == True:
+            msg.info("The path cache is shared with other boards, so only unused paths past its age and size limits are removed")
+            self.commit()
+            return 0, 0
+
+        self._ensureOpen()
+
+        nested = 0
+        for digest, keys in self._touched.items():
+            record = self._records.get(digest) or self._read(digest)
+            if record == None:
+                continue
+            unused = [key for key, value in record.items()
+                      if isinstance(value, dict) and key not in keys]
+            for key in unused:
+                del record[key]
+            if len(unused) > 0:
+                self._records[digest] = record
+                self._dirty.add(digest)
+                self._pruned.add(digest)
+                nested += len(unused)
+
+        self.commit()
+
+        removed = self._removeExcept(self._prefix, set(self._touched))
+        for digest in list(self._records):
+            if digest not in self._touched:
+                del self._records[digest]
+
+        return removed, nested
+
+
+    def close(self):
+        if self._opened == True:
+            self._close()
+            self._opened = False
+        self._geometry.close()
+
+
+    def _open(self):
+        """
+        Opens the backend
+        """
+        pass
+
+
+    def _close(self):
+        """
+        Closes the backend
+        """
+        pass
+
+
+    def _read(self, digest):
+        """
+        Returns the record of 'digest' from the backend, or None
+        """
+        return None
+
+
+    def _write(self, records, used, day, replace):
+        """
+        Writes dict 'records' of digest to record to the backend, and
+        sets the last use of those and of list of digests 'used' to
+        'day'. Records are merged with the stored ones, except for the
+        digests in set 'replace'.
+        """
+        pass
+
+
+    def _evict(self, oldest, max_size, keep):
+        """
+        Removes the records last used before day 'oldest', and then
+        the least recently used records until the store is no larger
+        than 'max_size' bytes, except for the digests in set 'keep'.
+        Either limit can be None. Returns a list of removed digests.
+        """
+        # Records in memory only last for the run
+        return []
+
+
+    def _removeExcept(self, prefix, keep):
+        """
+        Removes the records whose keys start with 'prefix', except for
+        the keys in set 'keep'; returns the amount removed
+        """
+        return len([digest for digest in self._records
+                    if digest.startswith(prefix) and digest not in keep])
+
+
+
+
+class JsonPathStore(PathStore):
+    """
+    The path database as a JSON file of records and an append-only
+    journal of the changes since, a JSON line per commit, in
+    'filename' and 'filename.journal'. Opening the store reads the
+    file and replays the journal. A commit takes the lock file, reads
+    what other processes appended to the journal since, so that its
+    records are merged with theirs, and appends its own line; when
+    the journal has grown larger than the file it's compacted into
+    it, by writing the file anew and renaming it over the old one. A
+    line cut short by a crash is dropped. Records keep the day they
+    were last used as 'used', and their size, with their geometry, as
+    'size'.
+
+    The store's total size is kept up to date as records are set and
+    removed, and records are kept in a heap by their last use, so that
+    eviction doesn't go over all the records.
+    """
+
+    def __init__(self, filename, max_age=None, max_size=None, shared=False,
+                 namespace=None):
+        PathStore.__init__(self, max_age, max_size, shared, namespace)
+        self._geometry = GeometryFile(_getGeometryFilename(filename), self._stats)
+        self._filename = filename
+        self._journal_filename = filename + '.journal'
+        self._lock_filename = filename + '.lock'
+        # The file as it was last read, and how much of the journal
+        self._stamp = None
+        self._journal_size = 0
+        # The size of each record, and of all of them
+        self._sizes = {}
+        self._total = 0
+        # (used, digest) of the records, least recently used first.
+        # A record's entry is outdated once it's used again, or
+        # removed, and is then dropped when it comes up
+        self._lru = []
+
+
+    def _open(self):
+        self._lock = _FileLock(self._lock_filename)
+        with self._lock:
+            self._sync()
+
+
+    def _sync(self):
+        """
+        Brings the records up to date with the file and the journal.
+        Only what was appended to the journal since the last sync is
+        read, unless the journal was compacted since.
+        """
+
+        stamp = _getFileStamp(self._filename)
+        if stamp != self._stamp:
+            records = {}
+            if stamp != None:
+                with open(self._filename, 'r') as f:
+                    records = json.load(f)
+                self._stats['bytes-loaded'] += stamp[1]
+            # Records written before their use, or size, was tracked
+            # count as used today
+            today = _today()
+            self._sizes = {}
+            self._total = 0
+            for digest, record in records.items():
+                record.setdefault('used', today)
+                self._setSize(record)
+                self._used[digest] = record['used']
+                self._sizes[digest] = record['size']
+                self._total += record['size']
+            self._records = records
+            self._lru = [(record['used'], digest) for digest, record in records.items()]
+            heapq.heapify(self._lru)
+            self._stamp = stamp
+            self._journal_size = 0
+
+        if not os.path.isfile(self._journal_filename):
+            return
+
+        with open(self._journal_filename, 'rb') as f:
+            f.seek(self._journal_size)
+            appended = f.read()
+        self._stats['bytes-loaded'] += len(appended)
+
+        lines = appended.split(b'\n')
+        # The last line is empty unless a writer crashed in the middle
+        # of it; it's cut off so that the next line starts cleanly
+        if lines[-1] != b'':
+            with open(self._journal_filename, 'r+b') as f:
+                f.truncate(self._journal_size + len(appended) - len(lines[-1]))
+        for line in lines[:-1]:
+            self._apply(json.loads(line.decode('utf-8')))
+        self._journal_size += len(appended) - len(lines[-1])
+
+
+    def _apply(self, entry):
+        """
+        Applies journal line 'entry' to the records
+        """
+        for digest, record in entry.get('set', {}).items():
+            self._setSize(record)
+            self._total += record['size'] - self._sizes.get(digest, 0)
+            self._sizes[digest] = record['size']
+            self._records[digest] = record
+            self._setUsed(digest, record['used'])
+        for digest in entry.get('used', []):
+            if digest in self._records:
+                self._records[digest]['used'] = entry['day']
+                self._setUsed(digest, entry['day'])
+        for digest in entry.get('remove', []):
+            self._records.pop(digest, None)
+            self._total -= self._sizes.pop(digest, 0)
+
+
+    def _setSize(self, record):
+        """
+        Sets the 'size' of 'record' if it doesn't have one
+        """
+        if 'size' not in record:
+            record['size'] = self._getSize(json.dumps(record, sort_keys=True), record)
+
+
+    def _setUsed(self, digest, day):
+        """
+        Sets the last use of 'digest' to 'day'
+        """
+        if self._used.get(digest) == day:
+            return
+        self._used[digest] = day
+        heapq.heappush(self._lru, (day, digest))
+        # Outdated entries are dropped when there are too many
+        if len(self._lru) > 2 * len(self._records) + 1024:
+            self._lru = [(record['used'], digest) for digest, record in self._records.items()]
+            heapq.heapify(self._lru)
+
+
+    def _append(self, entry):
+        """
+        Appends journal line 'entry' and applies it; the lock must be
+        held
+        """
+        line = (json.dumps(entry, sort_keys=True) + '\n').encode('utf-8')
+        with open(self._journal_filename, 'ab') as f:
+            f.write(line)
+        self._stats['bytes-written'] += len(line)
+        self._journal_size += len(line)
+        self._apply(entry)
+
+
+    def _compact(self, force=False):
+        """
+        Writes the records to the file and empties the journal, if the
+        journal is larger than the file or 'force' is True; the lock
+        must be held
+        """
+
+        if self._journal_size == 0:
+            return
+        if force == False and self._journal_size < max((self._stamp or (0, 0))[1],
+                                                       _MIN_COMPACT_SIZE):
+            return
+
+        text = json.dumps(self._records, sort_keys=True, indent=2)
+        writeAtomically(self._filename, text)
+        self._stats['bytes-written'] += len(text)
+        # Were the journal not emptied, because of a crash, replaying
+        # it again would do no harm
+        open(self._journal_filename, 'wb').close()
+        self._stamp = _getFileStamp(self._filename)
+        self._journal_size = 0
+
+
+    def _compactJournaled(self):
+        """
+        Compacts the geometry file to the geometry of the records, and
+        journals their new references; the lock must be held
+        """
+        changed = self._compactGeometry(self._records)
+        if len(changed) > 0:
+            self._append({'set': changed})
+
+
+    def _read(self, digest):
+        # All the records were read when the store was opened
+        return None
+
+
+    def _close(self):
+        self._lock.close()
+
+
+    def _write(self, records, used, day, replace):
+        with self._lock:
+            self._sync()
+            merged = {}
+            for digest, record in records.items():
+                if digest not in replace and digest in self._records:
+                    record = _mergeRecords(self._records[digest], record)
+                record['used'] = day
+                record.pop('size', None)
+                self._setSize(record)
+                merged[digest] = record
+            self._append({'set': merged,
+                          'used': [digest for digest in used if digest in self._records],
+                          'day': day})
+            self._compact()
+
+
+    def _evict(self, oldest, max_size, keep):
+        evicted = []
+
+        with self._lock:
+            self._sync()
+
+            total = self._total
+            kept = []
+            while len(self._lru) > 0:
+                used, digest = self._lru[0]
+                if digest not in self._records or self._used[digest] != used:
+                    heapq.heappop(self._lru)
+                    continue
+                if not ((oldest != None and used < oldest) or
+                        (max_size != None and total > max_size)):
+                    break
+                heapq.heappop(self._lru)
+                if digest in keep:
+                    kept.append((used, digest))
+                else:
+                    evicted.append(digest)
+                    total -= self._sizes[digest]
+            for entry in kept:
+                heapq.heappush(self._lru, entry)
+
+            if len(evicted) > 0:
+                self._append({'remove': evicted})
+                if self._needsCompacting(self._total):
+                    self._compactJournaled()
+                self._compact()
+
+        return evicted
+
+
+    def _removeExcept(self, prefix, keep):
+        with self._lock:
+            self._sync()
+            removed = [digest for digest in self._records
+                       if digest.startswith(prefix) and digest not in keep]
+            if len(removed) > 0:
+                self._append({'remove': removed})
+            self._compactJournaled()
+            self._compact(force=True)
+
+        return len(removed)
+
+
+
+
+class SqlitePathStore(PathStore):
+    """
+    The path database as an SQLite database with a row per digest,
+    holding the record as JSON, its size and the day it was last
+    used. Records are looked up when they're needed, and new and
+    changed records are written in a single transaction, which holds
+    the database's write lock while changed records are merged with
+    the stored ones. The database is in write-ahead-log mode, so it
+    can be read by other processes while it's being written.
+    """
+
+    def __init__(self, filename, max_age=None, max_size=None, shared=False,
+                 namespace=None):
+        PathStore.__init__(self, max_age, max_size, shared, namespace)
+        self._geometry = GeometryFile(_getGeometryFilename(filename), self._stats)
+        self._filename = filename
+
+
+    def _open(self):
+        self._db = sqlite3.connect(self._filename, timeout=60)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS paths "
+                         "(digest TEXT PRIMARY KEY, record TEXT NOT NULL, "
+                         "used INTEGER NOT NULL DEFAULT 0, "
+                         "size INTEGER NOT NULL DEFAULT 0)")
+
+        # Databases made before records' use was tracked count as
+        # used today
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(paths)")]
+        if 'used' not in columns:
+            self._db.execute("ALTER TABLE paths ADD COLUMN used INTEGER NOT NULL DEFAULT 0")
+            self._db.execute("ALTER TABLE paths ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+            self._db.execute("UPDATE paths SET used = ?, size = length(record)", (_today(),))
+
+        self._db.execute("CREATE INDEX IF NOT EXISTS paths_used ON paths (used)")
+        self._db.commit()
+
+
+    def _read(self, digest):
+        row = self._db.execute("SELECT record, used FROM paths WHERE digest = ?",
+                               (digest,)).fetchone()
+        if row == None:
+            return None
+        self._stats['bytes-loaded'] += len(row[0])
+        self._used[digest] = row[1]
+        return json.loads(row[0])
+
+
+    def _write(self, records, used, day, replace):
+        with self._db:
+            # Take the write lock before reading, so that no other
+            # process can change the records that are merged
+            self._db.execute("BEGIN IMMEDIATE")
+            rows = []
+            for digest, record in records.items():
+                if digest not in replace:
+                    row = self._db.execute("SELECT record FROM paths WHERE digest = ?",
+                                           (digest,)).fetchone()
+                    if row != None:
+                        record = _mergeRecords(json.loads(row[0]), record)
+                text = json.dumps(record, sort_keys=True)
+                rows.append((digest, text, day, self._getSize(text, record)))
+                self._stats['bytes-written'] += len(text)
+            self._db.executemany("INSERT OR REPLACE INTO paths (digest, record, used, size) "
+                                 "VALUES (?, ?, ?, ?)", rows)
+            self._db.executemany("UPDATE paths SET used = ? WHERE digest = ?",
+                                 [(day, digest) for digest in used])
+
+
+    def _evict(self, oldest, max_size, keep):
+        evicted = []
+
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            if oldest != None:
+                rows = self._db.execute("SELECT digest FROM paths WHERE used < ?",
+                                        (oldest,)).fetchall()
+                evicted = [row[0] for row in rows if row[0] not in keep]
+                self._db.executemany("DELETE FROM paths WHERE digest = ?",
+                                     [(digest,) for digest in evicted])
+
+            if max_size != None:
+                total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM paths").fetchone()[0]
+                if total > max_size:
+                    rows = self._db.execute("SELECT digest, size FROM paths "
+                                            "ORDER BY used, digest").fetchall()
+                    victims = []
+                    for digest, size in rows:
+                        if total <= max_size:
+                            break
+                        if digest in keep:
+                            continue
+                        total -= size
+                        victims.append(digest)
+                    self._db.executemany("DELETE FROM paths WHERE digest = ?",
+                                         [(digest,) for digest in victims])
+                    evicted += victims
+
+            if len(evicted) > 0:
+                total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM paths").fetchone()[0]
+                if self._needsCompacting(total):
+                    self._compactRows()
+
+        return evicted
+
+
+    def _compactRows(self):
+        """
+        Compacts the geometry file to the geometry of the stored
+        records, and updates their references; the write lock must be
+        held
+        """
+        rows = self._db.execute("SELECT digest, record FROM paths").fetchall()
+        records = dict((digest, json.loads(text)) for digest, text in rows)
+        updates = []
+        for digest, record in self._compactGeometry(records).items():
+            text = json.dumps(record, sort_keys=True)
+            updates.append((text, self._getSize(text, record), digest))
+        self._db.executemany("UPDATE paths SET record = ?, size = ? WHERE digest = ?",
+                             updates)
+
+
+    def _removeExcept(self, prefix, keep):
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute("CREATE TEMP TABLE IF NOT EXISTS kept (digest TEXT PRIMARY KEY)")
+            self._db.execute("DELETE FROM kept")
+            self._db.executemany("INSERT INTO kept (digest) VALUES (?)",
+                                 [(digest,) for digest in keep])
+            removed = self._db.execute("DELETE FROM paths WHERE substr(digest, 1, ?) = ? "
+                                       "AND digest NOT IN (SELECT digest FROM kept)",
+                                       (len(prefix), prefix)).rowcount
+            self._compactRows()
+        # Give the space back
+        self._db.execute("VACUUM")
+        return removed
+
+
+    def _close(self):
+        self._db.close()
+
+
+
+
+def _getGeometryFilename(filename):
+    """
+    Returns the name of the geometry file of the path database in
+    'filename'. Both backends use the same one, so a database that is
+    migrated from one to the other keeps its geometry.
+    """
+    return os.path.splitext(filename)[0] + '.geom'
+
+
+
+
+# Path store backends, by the name used in the board's configuration,
+# and the file each uses in the build directory
+_BACKENDS = {'sqlite': (SqlitePathStore, 'paths_db.sqlite'),
+             'json': (JsonPathStore, 'paths_db.json')}
+
+
+def openPathStore(build_dir, backend='sqlite', max_age=None, max_size=None,
+                  shared=False, namespace=None):
+    """
+    Returns the path database in directory 'build_dir' with backend
+    'backend', 'sqlite' or 'json', and an eviction policy of 'max_age'
+    days and 'max_size' bytes, for records in 'namespace'. 'shared' is
+    True when the directory is a path cache shared by several boards,
+    like userCacheDir(). A new SQLite database starts with the records
+    of the JSON database, if there is one; records from before records
+    were kept in namespaces can't be looked up, so they're left out.
+    """
+
+    if backend not in _BACKENDS:
+        msg.error("Unknown path database backend '%s'; options are %s" % (backend, ', '.join(sorted(_BACKENDS))))
+
+    store_class, filename = _BACKENDS[backend]
+    filename = os.path.join(build_dir, filename)
+    json_filename = os.path.join(build_dir, _BACKENDS['json'][1])
+
+    migrate = (backend == 'sqlite' and
+               not os.path.isfile(filename) and
+               (os.path.isfile(json_filename) or
+                os.path.isfile(json_filename + '.journal')))
+
+    store = store_class(filename, max_age, max_size, shared, namespace)
+
+    if migrate == True:
+        msg.info("Importing path database %s" % json_filename)
+        json_store = JsonPathStore(json_filename)
+        json_store._ensureOpen()
+        store._ensureOpen()
+        records = dict((digest, record) for digest, record in json_store._records.items()
+                       if '/' in digest)
+        store._write(records, [], _today(), set())
+        json_store.close()
+        skipped = len(json_store._records) - len(records)
+        if skipped > 0:
+            msg.info("Left out %d path records of an older format" % skipped)
+
+    return store
@@ -8,7 +8,9 @@ from . import messages as msg
 # pcbmode modules
 from . import utils
 from . import svg
+from . import affine
 from .point import Point
+from .geometry import pathDataToString
 
 
 
@@ -29,19 +31,24 @@ def placeShape(shape, svg_layer, invert=False, original=False):
     location = shape.getLocation()
 
     if original == False:
-        translate = 'translate(%s,%s)' % (round((((1,-1)[invert])*location.x), sig_dig),
-                                          round(location.y*config.cfg['invert-y'], sig_dig))
+        # Placing on the bottom mirrors the location horizontally, and
+        # the 'y' axis is inverted for SVG; both are a single scaling
+        placement = affine.scaling((1,-1)[invert], config.cfg['invert-y'])
+        x, y = placement.applyToPoint(location.x, location.y)
+        translate = 'translate(%s,%s)' % (round(x, sig_dig), round(y, sig_dig))
         transform = translate
     else:
         transform = None
 
+    # Transformed paths are kept as PathData and only turned into a
+    # string here, when the element is created
     if invert == True:
-        path = shape.getTransformedPath(True)
+        path = pathDataToString(shape.getTransformedPath(True))
     else:
         if original == True:
             path = shape.getOriginalPath()
         else:
-            path = shape.getTransformedPath()
+            path = pathDataToString(shape.getTransformedPath())
 
     element = et.SubElement(svg_layer, 
                             'path',
@@ -1,33 +1,56 @@
 #!/usr/bin/python
 
 from math import pi, sin, cos
-import decimal
-
-import pcbmode.config as config
+from array import array
 
 DEG2RAD = 2 * pi / 360
 
+# Significant digits that Point coordinates are rounded to. This is
+# read from the config once, with setSignificantDigits(), rather than
+# by every Point that is created
+_sig_dig = 8
+
+
+def setSignificantDigits(digits):
+    """
+    Sets the amount of significant digits Point coordinates are
+    rounded to
+    """
+    global _sig_dig
+    _sig_dig = digits
+
+
+
+class Point(object):
+
+    __slots__ = ('x', 'y')
 
-class Point:
-  
     def __init__(self, x=0, y=0):
-        try:
-            self.sig_dig = config.cfg['significant-digits']
-        except:
-            self.sig_dig = 8
-        self.x = round(float(x), self.sig_dig)
-        self.y = round(float(y), self.sig_dig)
-       
+        self.x = round(float(x), _sig_dig)
+        self.y = round(float(y), _sig_dig)
+
     def __add__(self, p):
-        """ add point 'p' of type Point to current point""" 
+        """ add point 'p' of type Point to current point"""
         return Point(self.x + p.x, self.y + p.y)
 
     def __sub__(self, p):
-        """ subtract point 'p' of type Point to current point""" 
+        """ subtract point 'p' of type Point to current point"""
         return Point(self.x - p.x, self.y - p.y)
 
+    def __iadd__(self, p):
+        """ add point 'p' of type Point to current point, in place """
+        self.x = round(self.x + p.x, _sig_dig)
+        self.y = round(self.y + p.y, _sig_dig)
+        return self
+
+    def __isub__(self, p):
+        """ subtract point 'p' of type Point from current point, in place """
+        self.x = round(self.x - p.x, _sig_dig)
+        self.y = round(self.y - p.y, _sig_dig)
+        return self
+
     def __repr__(self, d=2):
-        """ 
+        """
         return a string representation; 'd' determines amount
         of significant digits to display
         """
@@ -42,8 +65,8 @@ class Point:
         return not((self.x == p.x) and (self.y == p.y))
 
     def assign(self, x=0, y=0):
-        self.x = round(float(x), self.sig_dig) 
-        self.y = round(float(y), self.sig_dig) 
+        self.x = round(float(x), _sig_dig)
+        self.y = round(float(y), _sig_dig)
         return
 
     def rotate(self, deg, p):
@@ -66,3 +89,36 @@ class Point:
         self.x *= float(scalar)
         self.y *= float(scalar)
         return
+
+
+
+class PointArray(object):
+    """
+    A sequence of points kept in two array('d') buffers, 'x' and 'y',
+    instead of as a Point object per point. Points whose index is in
+    'arcs' are the end of a circular arc from the point before them;
+    the value is the arc's (center_x, center_y, clockwise). Points on
+    a fixed-point grid are kept in integer buffers of 'typecode'.
+    """
+
+    __slots__ = ('x', 'y', 'arcs')
+
+    def __init__(self, xs=(), ys=(), arcs=None, typecode='d'):
+        self.x = array(typecode, xs)
+        self.y = array(typecode, ys)
+        self.arcs = arcs or {}
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, n):
+        """ returns point 'n' as a Point """
+        return Point(self.x[n], self.y[n])
+
+    def __iter__(self):
+        for n in range(len(self.x)):
+            yield Point(self.x[n], self.y[n])
+
+    def append(self, x, y):
+        self.x.append(x)
+        self.y.append(y)
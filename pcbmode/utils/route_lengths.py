@@ -0,0 +1,65 @@
+#!/usr/bin/python
+
+import pcbmode.config as config
+
+from . import messages as msg
+from .geometry import parsePathData, absolutePathData, pathDataLengths
+
+
+
+def getRouteLengths(routes=None, tolerance=1e-6):
+    """
+    Returns the lengths of the routes 'routes', by default the board's
+    routes in config.rte['routes'], as a dict of PCB layer to a dict
+    of route id to length. Lengths are in the board's units and are
+    to within about 'tolerance' per curve. All routes are measured in
+    one batch, so this is fast for thousands of routes.
+    """
+
+    if routes == None:
+        routes = config.rte.get('routes') or {}
+
+    keys = []
+    paths = []
+
+    for pcb_layer in config.stk['layer-names']:
+        for route_id, route_dict in (routes.get(pcb_layer) or {}).items():
+            path = route_dict.get('value')
+            if route_dict.get('type') != 'path' or not path:
+                continue
+            keys.append((pcb_layer, route_id))
+            paths.append(absolutePathData(parsePathData(path)))
+
+    lengths = {}
+    for (pcb_layer, route_id), length in zip(keys, pathDataLengths(paths, tolerance)):
+        lengths.setdefault(pcb_layer, {})[route_id] = length
+
+    return lengths
+
+
+
+
+def reportRouteLengths():
+    """
+    Prints the length of each of the board's routes, grouped by PCB
+    layer and sorted by route id
+    """
+
+    units = config.brd['config']['units']
+
+    lengths = getRouteLengths()
+
+    if lengths == {}:
+        msg.info("There are no routes to measure")
+        return
+
+    for pcb_layer in config.stk['layer-names']:
+        layer_lengths = lengths.get(pcb_layer)
+        if layer_lengths == None:
+            continue
+        msg.info("Routes on %s layer: %d, total length %.4f %s" % (pcb_layer,
+                                                                   len(layer_lengths),
+                                                                   sum(layer_lengths.values()),
+                                                                   units))
+        for route_id in sorted(layer_lengths):
+            msg.subInfo("%s: %.4f %s" % (route_id, layer_lengths[route_id], units))
@@ -1,10 +1,6 @@
 #!/usr/bin/python
 
-import os
 import copy
-from lxml import etree as et
-
-from pkg_resources import resource_exists, resource_filename
 
 import pcbmode.config as config
 from . import messages as msg
@@ -12,8 +8,11 @@ from . import messages as msg
 # import pcbmode modules
 from . import utils
 from . import svg
+from . import affine
+from . import font as font_cache
 from .point import Point
 from .svgpath import SvgPath
+from .text import layoutText
 
 
 
@@ -25,6 +24,7 @@ class Shape():
     def __init__(self, shape):
 
         gerber_lp = None
+        bbox = None
         mirror = False
 
         self._shape_dict = shape
@@ -72,30 +72,9 @@ class Shape():
             except KeyError:
                 msg.error("Could not find the text to display. The text to be displayed should be defined in the 'value' field, for example, 'value': 'DEADBEEF\\nhar\\nhar'")
 
-            # Get the font's name
-            font = self._shape_dict.get('font-family') or config.stl['layout']['defaults']['font-family']
-            font_filename = "%s.svg" % font
-
-            # Search for the font SVG in these paths
-            paths = [os.path.join(config.cfg['base-dir'],
-                                  config.cfg['locations']['fonts'],
-                                  font_filename)]
-
-            font_resource = ('pcbmode', '/'.join(['fonts',font_filename]))
-            if resource_exists(*font_resource):
-                paths.append(resource_filename(*font_resource))
-
-            filenames = ''
-            font_data = None
-            for path in paths:
-                filename = path
-                filenames += "  %s \n" % filename
-                if os.path.isfile(filename):
-                    font_data = et.ElementTree(file=filename)
-                    break
-
-            if font_data == None:
-                msg.error("Couldn't find style file %s. Looked for it here:\n%s" % (font_filename, filenames))
+            # Get the font, which is only loaded once per run
+            font = font_cache.getFont(self._shape_dict.get('font-family') or
+                                      config.stl['layout']['defaults']['font-family'])
 
             try:
                 fs = self._shape_dict['font-size']
@@ -111,13 +90,13 @@ class Shape():
 
             # With the units-per-em we can figure out the scale factor
             # to use for the desired font size
-            units_per_em = float(font_data.find("//n:font-face", namespaces={'n': config.cfg['namespace']['svg']}).get('units-per-em')) or 1000
-            self._scale = font_size/units_per_em
+            self._scale = font_size/font.getUnitsPerEm()
 
-            # Get the path to use. This returns the path without
-            # scaling, which will be applied later, in the same manner
-            # as to the other shape types
-            path, gerber_lp = utils.textToPath(font_data,
+            # Get the path to use. This returns the path, as PathData
+            # with its bounding box, without scaling, which will be
+            # applied later, in the same manner as to the other shape
+            # types
+            path, bbox, gerber_lp = layoutText(font,
                                                self._text,
                                                letter_spacing,
                                                line_height,
@@ -136,12 +115,15 @@ class Shape():
             msg.error("'%s' is not a recongnised shape type" % self._type)
 
 
-        self._path = SvgPath(path, gerber_lp)
+        self._path = SvgPath(path, gerber_lp, bbox)
 
-        self._path.transform(scale=self._scale, 
-                             rotate_angle=self._rotate, 
-                             rotate_point=self._rotate_point, 
-                             mirror=self._place_mirrored)
+        # The shape's rotation and scale are kept as a matrix that is
+        # only applied to the path when the transformed path, or its
+        # dimensions, are needed. This way transforms that are added
+        # later, such as a component's, are composed into the matrix
+        # and the path's coordinates are transformed just once
+        self._matrix = affine.rotation(self._rotate) * affine.scaling(self._scale)
+        self._transformed = False
 
         self._gerber_lp = (shape.get('gerber-lp') or 
                            shape.get('gerber_lp') or 
@@ -154,16 +136,28 @@ class Shape():
 
 
     def transformPath(self, scale=1, rotate=0, rotate_point=Point(), mirror=False, add=False):
-        if add == False:
-            self._path.transform(scale,
-                                 rotate*self._inv_rotate,
-                                 rotate_point,
-                                 mirror)
-        else:
-            self._path.transform(scale*self._scale,
-                                 rotate*self._inv_rotate+self._rotate,
-                                 rotate_point+self._rotate_point,
-                                 mirror)
+        """
+        Sets the path's transform, or with 'add', composes it with the
+        current one. 'rotate_point' isn't used; rotation is around the
+        path's center
+        """
+        matrix = affine.rotation(rotate*self._inv_rotate) * affine.scaling(scale)
+        if add == True:
+            matrix = matrix * self._matrix
+        self._matrix = matrix
+        self._place_mirrored = mirror
+        self._transformed = False
+
+
+
+    def _transformPath(self):
+        """
+        Applies the shape's transform matrix to the path, if it hasn't
+        been already
+        """
+        if self._transformed == False:
+            self._path.transformByMatrix(self._matrix, mirror=self._place_mirrored)
+            self._transformed = True
 
 
 
@@ -192,6 +186,7 @@ class Shape():
 
 
     def getTransformedPath(self, mirrored=False):
+        self._transformPath()
         if mirrored == True:
             return self._path.getTransformedMirrored()
         else:
@@ -200,11 +195,13 @@ class Shape():
 
 
     def getWidth(self):
+        self._transformPath()
         return self._path.getWidth()
 
 
 
     def getHeight(self):
+        self._transformPath()
         return self._path.getHeight()
 
 
@@ -0,0 +1,144 @@
+#!/usr/bin/python
+
+import re
+from array import array
+
+try:
+    # Python 3
+    from html import unescape
+except ImportError:
+    # Python 2
+    import HTMLParser
+    unescape = HTMLParser.HTMLParser().unescape
+
+import pcbmode.config as config
+from . import messages as msg
+from .geometry import (PathData, relativePathData, translatePathData,
+                       mirrorPathData)
+
+
+
+# Text that was laid out in this process, by its font's file, text,
+# letter spacing, line height and scale
+_layouts = {}
+
+# Splits text into its characters, HTML character references and
+# newlines
+_SYMBOLS = re.compile(r'(\&#x[0-9abcdef]*;|.|\n)')
+
+
+
+
+def layoutText(font, text, letter_spacing, line_height, scale_factor):
+    """
+    Returns the path of 'text' (unicode and newlines allowed) in Font
+    'font', as relative PathData, its bounding box and its gerber-lp.
+    The path is mirrored and centered on its bounding box, and in font
+    units; 'scale_factor' is needed in order to scale 'letter_spacing'
+    and 'line_height' to the original scale of the font. The same text
+    is only laid out once per run, so the returned path is shared and
+    mustn't be changed.
+    """
+
+    key = (font.getFilename(), text, letter_spacing, line_height, scale_factor)
+    layout = _layouts.get(key)
+    if layout == None:
+        layout = _layoutText(font, text, letter_spacing, line_height, scale_factor)
+        _layouts[key] = layout
+    return layout
+
+
+
+
+def _layoutText(font, text, letter_spacing, line_height, scale_factor):
+    """
+    Lays out 'text' by placing a copy of each glyph's relative path
+    after the previous one, and returns its path, bounding box and
+    gerber-lp. The text's bounding box is that of its glyphs' boxes
+    where they're placed, so the path itself is never measured.
+    """
+
+    units_per_em = font.getUnitsPerEm()
+
+    if line_height == None:
+        line_height = units_per_em
+
+    # Glyphs are placed where they'd be read back from the text's path
+    # as written, i.e., rounded to the significant digits
+    sig_dig = config.cfg['significant-digits']
+
+    cmds = array('B')
+    coords = None
+    digits = None
+    bbox = None
+    gerber_lp = ''
+
+    text_width = 0
+    text_height = 0
+
+    for symbol in _SYMBOLS.findall(text):
+
+        symbol = unescape(symbol)
+
+        if symbol == '\n':
+            text_width = 0
+            text_height += units_per_em + (line_height/scale_factor-units_per_em)
+            continue
+
+        glyph = font.getGlyph(symbol)
+        if glyph == None:
+            msg.error("Damn, there's no glyph definition for '%s' in the '%s' font :(" % (symbol, font.getName()))
+
+        relative = glyph['relative']
+        if symbol != ' ' and relative != None:
+            path = relative.copy()
+            first_x, first_y = path.getFirstPoint()
+            x = text_width + first_x
+            y = first_y - text_height
+            if path.digits is None:
+                path.coords = array('d', [round(v, sig_dig) + 0.0 for v in path.coords])
+                x = round(x, sig_dig) + 0.0
+                y = round(y, sig_dig) + 0.0
+            path.setFirstPoint(x, y)
+            # Where it is on the fixed-point grid, if it's on one
+            x, y = path.getFirstPoint()
+
+            if coords == None:
+                coords = array(path.coords.typecode)
+                digits = path.digits
+            cmds.extend(path.cmds)
+            coords.extend(path.coords)
+
+            # The glyph's box, moved to where the glyph is
+            dx = x - first_x
+            dy = y - first_y
+            min_x, min_y, max_x, max_y = glyph['bounding-box']
+            glyph_bbox = (min_x + dx, min_y + dy, max_x + dx, max_y + dy)
+            if bbox == None:
+                bbox = glyph_bbox
+            else:
+                bbox = (min(bbox[0], glyph_bbox[0]), min(bbox[1], glyph_bbox[1]),
+                        max(bbox[2], glyph_bbox[2]), max(bbox[3], glyph_bbox[3]))
+
+            gerber_lp += glyph['gerber-lp']
+
+        text_width += glyph['advance']+letter_spacing/scale_factor
+
+    if bbox == None:
+        msg.error("The text '%s' has nothing to draw" % text)
+
+    path = relativePathData(PathData(cmds, coords, digits))
+
+    # Center the text on its bounding box, and mirror it, which moves
+    # the box along with it
+    cx = (bbox[0]+bbox[2])/2
+    cy = (bbox[1]+bbox[3])/2
+    first_x, first_y = path.getFirstPoint()
+    path = translatePathData(path, -cx, -cy)
+    x, y = path.getFirstPoint()
+    cx = first_x - x
+    cy = first_y - y
+    path = mirrorPathData(path)
+    bbox = (cx-bbox[2], bbox[1]-cy, cx-bbox[0], bbox[3]-cy)
+
+    return path, bbox, gerber_lp
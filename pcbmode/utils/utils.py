@@ -8,13 +8,6 @@ import math
 from operator import itemgetter # for sorting lists by dict value
 from lxml import etree as et
 
-try:
-    # Python 3
-    import html.parser as HTMLParser
-except:
-    # Python 2
-    import HTMLParser
-
 from pkg_resources import get_distribution
 
 import pcbmode.config as config
@@ -525,86 +518,14 @@ def getTextParams(font_size, letter_spacing, line_height):
 
 
 
-def textToPath(font_data, text, letter_spacing, line_height, scale_factor):
-    from .svgpath import SvgPath
+def digest(string):
     """
-    Convert a text string (unicode and newlines allowed) to a path.
-    The 'scale_factor' is needed in order to scale rp 'letter_spacing' and 'line_height'
-    to the original scale of the font.
+    Returns the digest of 'string', which can also be bytes
     """
-
-    # This the horizontal advance that applied to all glyphs unless there's a specification for
-    # for the glyph itself
-    font_horiz_adv_x = float(font_data.find("//n:font", namespaces={'n': config.cfg['namespace']['svg']}).get('horiz-adv-x'))
-    
-    # This is the number if 'units' per 'em'. The default, in the absence of a definition is 1000
-    # according to the SVG spec
-    units_per_em = float(font_data.find("//n:font-face", namespaces={'n': config.cfg['namespace']['svg']}).get('units-per-em')) or 1000
-
-    glyph_ascent = float(font_data.find("//n:font-face", namespaces={'n': config.cfg['namespace']['svg']}).get('ascent'))
-    glyph_decent = float(font_data.find("//n:font-face", namespaces={'n': config.cfg['namespace']['svg']}).get('descent'))
- 
-    text_width = 0
-    text_path = ''
-
-    # split text into charcters and find unicade chars
-    try:
-        text = re.findall(r'(\&#x[0-9abcdef]*;|.|\n)', text)
-    except:
-        throw("There's a problem parsing the text '%s'. Unicode and \\n newline should be fine, by the way." % text)
- 
-
-    # instantiate HTML parser
-    htmlpar = HTMLParser.HTMLParser()
-    gerber_lp = ''
-    text_height = 0
-
-    if line_height == None:
-        line_height = units_per_em
-
-    for i, symbol in enumerate(text[:]):
-
-        symbol = htmlpar.unescape(symbol)
-        # get the glyph definition from the file
-        if symbol == '\n':
-            text_width = 0
-            text_height += units_per_em + (line_height/scale_factor-units_per_em)
-        else:
-            glyph = font_data.find(u'//n:glyph[@unicode="%s"]' % symbol, namespaces={'n': config.cfg['namespace']['svg']})
-            if glyph == None:
-                utils.throw("Damn, there's no glyph definition for '%s' in the '%s' font :(" % (symbol, font))
-            else:
-                # Unless the glyph has its own width, use the global font width
-                glyph_width = float(glyph.get('horiz-adv-x') or font_horiz_adv_x)
-                if symbol != ' ':
-                    glyph_path = SvgPath(glyph.get('d'))
-                    first_point = glyph_path.getFirstPoint()
-                    offset_x = float(first_point[0])
-                    offset_y = float(first_point[1])
-                    path = glyph_path.getRelative()
-                    path = re.sub('^(m\s?[-\d\.]+\s?,\s?[-\d\.]+)', 'M %s,%s' % (str(text_width+offset_x), str(offset_y-text_height)), path)
-                    gerber_lp += (glyph.get('gerber-lp') or 
-                                  glyph.get('gerber_lp') or 
-                                  "%s" % 'd'*glyph_path.getNumberOfSegments())
-                    text_path += "%s " % (path)
-
-            text_width += glyph_width+letter_spacing/scale_factor
-
-
-    # Mirror text 
-    text_path = SvgPath(text_path)
-    text_path.transform()
-    text_path = text_path.getTransformedMirrored()
-
-    return text_path, gerber_lp
-
-
-
-
-
-def digest(string):
     digits = config.cfg['digest-digits']
-    return hashlib.md5(string.encode()).hexdigest()[:digits-1]
+    if not isinstance(string, (bytes, bytearray)):
+        string = string.encode()
+    return hashlib.md5(string).hexdigest()[:digits-1]
 
 
 
@@ -0,0 +1,164 @@
+#!/usr/bin/python
+
+"""
+Checks that the SVG path tokeniser reads paths the same way the
+pyparsing grammar it replaced did
+"""
+
+import random
+import unittest
+
+import pyparsing as PYP
+
+from pcbmode.utils.geometry import parsePathData
+
+
+
+def _makeSVGGrammar():
+    """
+    The SVG path grammar as SvgPath used to make it
+    """
+    comma = PYP.Literal(",").suppress()
+    coord = PYP.Regex(r"-?\d+(\.\d*)?([Ee][+-]?\d+)?")
+    one_coord = PYP.Group(coord)
+    xycoords = PYP.Group(coord + PYP.Optional(comma) + coord)
+    two_xycoords = xycoords + PYP.Optional(comma) + xycoords
+    three_xycoords = xycoords + PYP.Optional(comma) + xycoords + PYP.Optional(comma)+xycoords
+
+    commands = []
+    for letter, coords in [('M', xycoords), ('C', three_xycoords),
+                           ('Q', two_xycoords), ('T', xycoords),
+                           ('L', xycoords), ('V', one_coord),
+                           ('H', one_coord), ('S', two_xycoords)]:
+        for cmd in (letter, letter.lower()):
+            commands.append(PYP.Literal(cmd) + PYP.OneOrMore(coords))
+    commands.append(PYP.Literal('Z'))
+    commands.append(PYP.Literal('z'))
+
+    path_cmd = commands[0]
+    for command in commands[1:]:
+        path_cmd = path_cmd | command
+
+    return PYP.OneOrMore(PYP.Group(path_cmd))
+
+
+
+# Coordinate pairs per repetition of each command, and 0 for single
+# coordinates
+_PAIRS = {'m': 1, 'l': 1, 't': 1, 'c': 3, 's': 2, 'q': 2,
+          'h': 0, 'v': 0, 'z': None}
+
+
+
+
+def _randomNumber(rand):
+    number = rand.choice(['%d', '%.1f', '%.3f', '%.8f', '%d.', '%.2e', '%.3E'])
+    return number % rand.uniform(-1000, 1000)
+
+
+
+
+def _randomPath(rand):
+    """
+    Returns a random path that the old grammar accepts
+    """
+
+    def sep(allow_comma, number):
+        choices = [' ', '  ', '\n']
+        if allow_comma:
+            choices += [',', ', ', ' ,']
+        if number[0] == '-':
+            choices.append('')
+        return rand.choice(choices)
+
+    path = rand.choice(['', ' '])
+    for n in range(rand.randint(1, 12)):
+        cmd = 'm' if n == 0 else rand.choice('mlhvcsqtz')
+        if rand.random() < 0.5:
+            cmd = cmd.upper()
+        path += cmd
+        pairs = _PAIRS[cmd.lower()]
+        if pairs == None:
+            path += rand.choice(['', ' '])
+            continue
+        for repeat in range(rand.randint(1, 3)):
+            if pairs == 0:
+                number = _randomNumber(rand)
+                path += sep(False, number) + number
+                continue
+            for pair in range(pairs):
+                x = _randomNumber(rand)
+                y = _randomNumber(rand)
+                path += sep(pair > 0, x) + x + sep(True, y) + y
+    return path
+
+
+
+
+def _expectedPathData(grammar, path):
+    """
+    Returns the command codes and coordinates that 'path', as parsed by
+    the old grammar, should become
+    """
+    cmds = []
+    coords = []
+    for item in grammar.parseString(path):
+        cmd = item[0]
+        numbers = [float(number) for coord in item[1:] for number in coord]
+        coords.extend(numbers)
+        pairs = _PAIRS[cmd.lower()]
+        if pairs == None:
+            cmds.append(cmd)
+            continue
+        repeat = len(numbers) // max(1, 2*pairs)
+        if cmd in 'mM':
+            # Coordinates after a 'move to' are 'line to's
+            cmds.extend([cmd] + [{'m': 'l', 'M': 'L'}[cmd]] * (repeat-1))
+        else:
+            cmds.extend([cmd] * repeat)
+    return cmds, coords
+
+
+
+
+class TestPathGrammar(unittest.TestCase):
+
+    def test_fuzzedPaths(self):
+        grammar = _makeSVGGrammar()
+        rand = random.Random(1)
+        for n in range(5000):
+            path = _randomPath(rand)
+            cmds, coords = _expectedPathData(grammar, path)
+            data = parsePathData(path)
+            self.assertEqual([chr(code) for code in data.cmds], cmds, path)
+            self.assertEqual(list(data.coords), coords, path)
+
+
+    def test_paths(self):
+        grammar = _makeSVGGrammar()
+        for path in ["M 1,2 3,4 5,6 z",
+                     "m-1-2l3-4h5v6c1,2 3,4 5,6s7,8 9,10q1 2 3 4t5 6z",
+                     "M1e2,3E-1 L 4. 5.",
+                     "M 0 0 C 1 2 3 4 5 6 7 8 9 10 11 12 Z M 1 1 z"]:
+            cmds, coords = _expectedPathData(grammar, path)
+            data = parsePathData(path)
+            self.assertEqual([chr(code) for code in data.cmds], cmds, path)
+            self.assertEqual(list(data.coords), coords, path)
+
+
+    def test_spec(self):
+        # The old grammar doesn't read these; the tokeniser reads them
+        # as the SVG spec does
+        self.assertEqual(list(parsePathData("M10.5.5").coords), [10.5, 0.5])
+        self.assertEqual(list(parsePathData("M+1,.5").coords), [1, 0.5])
+
+
+    def test_errors(self):
+        for path in ["1,2 M 3,4", "M 1,2 L 3", "M 1,2 z 3", "M 1,2 A 3,4"]:
+            self.assertRaises(Exception, parsePathData, path)
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+#!/usr/bin/python
+
+"""
+Checks that paths on a fixed-point grid are measured as their float
+form is
+"""
+
+import unittest
+
+from pcbmode.utils.geometry import (parsePathData, absolutePathData,
+                                    pathDataLength, pathDataLengths)
+
+
+
+class TestPathLength(unittest.TestCase):
+
+    def test_fixedPoint(self):
+        for path in ["M0 0 L3 4",
+                     "M0 0 L3 4 C 3 4 5 5 6 6",
+                     "m1.25,2.5 3,4 c1,2 3,4 5,6s7,8 9,10q1 2 3 4t5 6z",
+                     "M 0 0 C 1 2 3 4 5 6 Z M 1 1 h2 v3 z"]:
+            expected = pathDataLength(absolutePathData(parsePathData(path)))
+            length = pathDataLength(absolutePathData(parsePathData(path, 6)))
+            self.assertAlmostEqual(length, expected, 5, path)
+
+
+    def test_mixed(self):
+        paths = ["M0 0 L3 4", "M0 0 C 1 2 3 4 5 6"]
+        expected = pathDataLengths([absolutePathData(parsePathData(path))
+                                    for path in paths])
+        lengths = pathDataLengths([absolutePathData(parsePathData(path, digits))
+                                   for path, digits in zip(paths, (None, 3))])
+        self.assertAlmostEqual(lengths[0], 5.0, 9)
+        for length, value in zip(lengths, expected):
+            self.assertAlmostEqual(length, value, 5)
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()